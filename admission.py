@@ -0,0 +1,261 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+import logging
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, lowest value first
+EMERGENCY = 0
+NORMAL = 1
+PRIORITY_NAMES = {EMERGENCY: "emergency", NORMAL: "normal"}
+
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "llm_admission_wait_seconds",
+    "Time requests waited for an upstream slot, by priority",
+    ["priority"]
+)
+ADMISSION_SHED = REGISTRY.counter(
+    "llm_admission_shed_total",
+    "Requests shed because the upstream queue was full or they waited too long",
+    ["priority"]
+)
+
+
+class Overloaded(Exception):
+    """A request was shed because the upstream queue is full or it waited too long"""
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Waiter:
+    __slots__ = ("priority", "granted", "cancelled", "event", "loop", "future")
+
+    def __init__(self, priority, loop=None):
+        self.priority = priority
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+            self.future = None
+        else:
+            self.event = None
+            self.future = loop.create_future()
+
+    def wake(self):
+        if self.future is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+class AdmissionController:
+    """Gate upstream calls with a bounded priority queue and slots reserved for emergencies
+
+    Emergency requests are queued ahead of everything else and may use the
+    reserved slots. Normal requests are shed once max_queue requests of any
+    priority are waiting; emergencies have their own bound, emergency_queue
+    (max_queue by default), so normal traffic never crowds them out but a
+    flood of messages that merely look urgent is still shed. Any request is
+    shed after queue_timeout seconds. Threads and event-loop tasks share the
+    same slots.
+    """
+
+    def __init__(self, max_concurrent=32, max_queue=None, queue_timeout=None, reserved=0, emergency_queue=None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue  # None queues without bound
+        self.emergency_queue = max_queue if emergency_queue is None else emergency_queue
+        self.queue_timeout = queue_timeout
+        self.reserved = min(reserved, max_concurrent - 1)  # Slots only emergencies may use
+
+        self._lock = threading.Lock()
+        self._queue = []  # heap of (priority, sequence, waiter)
+        self._sequence = itertools.count()
+        self._queued = {priority: 0 for priority in PRIORITY_NAMES}
+        self.active = 0
+        self.max_queue_depth = 0
+        self.admitted = {priority: 0 for priority in PRIORITY_NAMES}
+        self.shed = {priority: 0 for priority in PRIORITY_NAMES}
+
+    @property
+    def queue_depth(self):
+        return sum(self._queued.values())
+
+    def _has_slot(self, priority):
+        limit = self.max_concurrent if priority == EMERGENCY else self.max_concurrent - self.reserved
+        return self.active < limit
+
+    def _admit_now(self, priority):
+        """Take a slot without queueing if nobody of equal or higher priority is waiting"""
+        waiting_ahead = any(self._queued[p] for p in self._queued if p <= priority)
+        if waiting_ahead or not self._has_slot(priority):
+            return False
+        self.active += 1
+        self.admitted[priority] += 1
+        return True
+
+    def _enqueue(self, waiter):
+        if waiter.priority == EMERGENCY:
+            full = self.emergency_queue is not None and self._queued[EMERGENCY] >= self.emergency_queue
+        else:
+            full = self.max_queue is not None and self.queue_depth >= self.max_queue
+        if full:
+            self._record_shed(waiter.priority)
+            raise Overloaded("Upstream queue is full")
+        heapq.heappush(self._queue, (waiter.priority, next(self._sequence), waiter))
+        self._queued[waiter.priority] += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def _abandon(self, waiter):
+        """Drop a waiter that stopped waiting before it was granted a slot"""
+        waiter.cancelled = True
+        self._queued[waiter.priority] -= 1
+
+    def _dispatch(self):
+        """Hand free slots to queued waiters, highest priority first"""
+        while self._queue:
+            priority, _, waiter = self._queue[0]
+            if waiter.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            if not self._has_slot(priority):
+                return
+            heapq.heappop(self._queue)
+            self._queued[priority] -= 1
+            self.active += 1
+            self.admitted[priority] += 1
+            waiter.granted = True
+            waiter.wake()
+
+    def _record_shed(self, priority):
+        self.shed[priority] += 1
+        ADMISSION_SHED.inc(priority=PRIORITY_NAMES[priority])
+        logger.warning(f"Shedding {PRIORITY_NAMES[priority]} request, {self.queue_depth} queued")
+
+    def acquire(self, priority=NORMAL, timeout=None):
+        """Block until a slot is free, raising Overloaded if the request is shed"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        started = time.perf_counter()
+        with self._lock:
+            if self._admit_now(priority):
+                return
+            waiter = _Waiter(priority)
+            self._enqueue(waiter)
+
+        granted = waiter.event.wait(timeout)
+        with self._lock:
+            # The slot may have been granted just as the wait timed out
+            if not granted and not waiter.granted:
+                self._abandon(waiter)
+                self._record_shed(priority)
+                raise Overloaded(f"Waited {timeout}s for an upstream slot")
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, priority=PRIORITY_NAMES[priority])
+
+    async def aacquire(self, priority=NORMAL, timeout=None):
+        """Await a free slot without blocking the event loop, raising Overloaded if shed"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        started = time.perf_counter()
+        with self._lock:
+            if self._admit_now(priority):
+                return
+            waiter = _Waiter(priority, asyncio.get_running_loop())
+            self._enqueue(waiter)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._abandon(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                if granted:
+                    self.release()
+                raise
+            if not granted:
+                with self._lock:
+                    self._record_shed(priority)
+                raise Overloaded(f"Waited {timeout}s for an upstream slot")
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, priority=PRIORITY_NAMES[priority])
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority=NORMAL, timeout=None):
+        self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, priority=NORMAL, timeout=None):
+        await self.aacquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        """Return slot usage, queue depth and shedding counters"""
+        with self._lock:
+            return {
+                "active": self.active,
+                "max_concurrent": self.max_concurrent,
+                "reserved_for_emergency": self.reserved,
+                "max_emergency_queue": self.emergency_queue,
+                "queued": {PRIORITY_NAMES[p]: count for p, count in self._queued.items()},
+                "max_queue_depth": self.max_queue_depth,
+                "admitted": {PRIORITY_NAMES[p]: count for p, count in self.admitted.items()},
+                "shed": {PRIORITY_NAMES[p]: count for p, count in self.shed.items()}
+            }
+
+
+class RateLimiter:
+    """Per-key token buckets, such as messages per user session"""
+
+    def __init__(self, rate=0.5, burst=10, max_keys=10000):
+        self.rate = rate  # Tokens added per second
+        self.burst = burst  # Bucket capacity
+        self.max_keys = max_keys
+
+        self._buckets = OrderedDict()  # key -> [tokens, last refill time]
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def check(self, key, cost=1):
+        """Take cost tokens for key; return 0 when allowed, otherwise seconds until it would be"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now]
+                # Idle keys are forgotten first; a forgotten key starts with a full bucket
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            self.limited += 1
+            return (cost - bucket[0]) / self.rate
+
+    def stats(self):
+        with self._lock:
+            return {"tracked_keys": len(self._buckets), "limited": self.limited}
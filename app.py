@@ -1,6 +1,26 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, session, g
 from safety_assistant import SafetyAssistant
+from llm_backend import OfflineBackend
+from resilience import CircuitBreaker, HedgePolicy, RetryPolicy
+from admission import AdmissionController, RateLimiter
+from context_manager import ContextManager
+from response_buffer import ResponseBuffer
+from session_manager import SessionManager
+from conversation_store import ConversationStore
+from shared_store import SharedStore, SharedSessionManager, SharedRateLimiter, SharedResponseBuffer
+from response_cache import ResponseCache
+from budget_engine import BudgetEngine
+from bot_registry import BotRegistry, SafetyBot, TravelBot, UnknownBot
+from chatbot import DESTINATIONS_PATH, TravelBudgetBot
+from trip_extractor import TripExtractor
+from metrics import REGISTRY
 import os
+import json
+import atexit
+import math
+from concurrent.futures import ThreadPoolExecutor
+import secrets
+import time
 from dotenv import load_dotenv
 import logging
 
@@ -14,13 +34,245 @@ load_dotenv()
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
 
-# Initialize safety assistant chatbot
+# Cache model responses in memory and, unless disabled, on disk under Instance/
+response_cache = ResponseCache(
+    max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '1000')),
+    ttl=int(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+    db_path=os.getenv('RESPONSE_CACHE_DB', os.path.join(app.root_path, 'Instance', 'response_cache.db')) or None
+)
+
+# Initialize safety assistant chatbot. The model client is configured lazily,
+# so a missing key or unknown backend leaves the app answering from local tips.
+assistant_options = dict(
+    cache=response_cache,
+    coalesce_window=float(os.getenv('COALESCE_WINDOW', '0')),
+    # Upstream slots shared by every request; emergencies queue first, keep a
+    # few slots to themselves and have their own queue bound, so normal traffic
+    # filling the queue never sheds them
+    admission=AdmissionController(
+        max_concurrent=int(os.getenv('MAX_UPSTREAM_CONCURRENCY', '32')),
+        max_queue=int(os.getenv('UPSTREAM_QUEUE_SIZE', '64')),
+        queue_timeout=float(os.getenv('UPSTREAM_QUEUE_TIMEOUT', '10')),
+        reserved=int(os.getenv('EMERGENCY_RESERVED_SLOTS', '2')),
+        emergency_queue=int(os.getenv('EMERGENCY_QUEUE_SIZE', os.getenv('UPSTREAM_QUEUE_SIZE', '64')))
+    ),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5')),
+        reset_timeout=float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+    ),
+    retry=RetryPolicy(attempts=int(os.getenv('UPSTREAM_ATTEMPTS', '3'))),
+    context_manager=ContextManager(
+        budget_tokens=int(os.getenv('CONTEXT_TOKEN_BUDGET', '600')),
+        summary_tokens=int(os.getenv('CONTEXT_SUMMARY_TOKENS', '120'))
+    ),
+    # Hedging doubles upstream calls for the slowest requests, so it is opt-in
+    hedge=HedgePolicy(percentile=float(os.getenv('HEDGE_PERCENTILE'))) if os.getenv('HEDGE_PERCENTILE') else None
+)
 try:
-    assistant = SafetyAssistant()
+    assistant = SafetyAssistant(**assistant_options)
     logger.info("Safety Assistant initialized successfully")
 except Exception as e:
-    logger.error(f"Failed to initialize Safety Assistant: {str(e)}")
-    assistant = None
+    logger.error(f"Failed to initialize Safety Assistant, serving offline answers only: {str(e)}")
+    assistant = SafetyAssistant(backend=OfflineBackend(str(e)), **assistant_options)
+
+# Configure the model client off the request path
+if os.getenv('MODEL_WARMUP', '1') != '0':
+    assistant.start_warm_up()
+
+# With several worker processes (see serve.py), sessions, rate limits and
+# buffered chunks live in one SQLite file so any worker can serve any request
+shared_state_db = os.getenv('SHARED_STATE_DB')
+shared_store = SharedStore(shared_state_db) if shared_state_db else None
+
+# Undelivered response chunks stay on the server until the client asks for them
+response_buffer_options = dict(
+    max_responses=int(os.getenv('RESPONSE_BUFFER_SIZE', '1000')),
+    ttl=int(os.getenv('RESPONSE_BUFFER_TTL', '300'))
+)
+if shared_store:
+    response_buffer = SharedResponseBuffer(shared_store, **response_buffer_options)
+else:
+    response_buffer = ResponseBuffer(**response_buffer_options)
+
+# Produces the model's detailed answer to emergencies after the instant local reply is sent
+detail_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('DETAIL_WORKERS', '16')),
+    thread_name_prefix='detail'
+)
+
+# Messages per session. Emergencies draw on a separate, more generous bucket,
+# so a session that used up its normal messages can still report one, but
+# phrasing every message as an emergency is no way around the limit.
+rate_limit_options = dict(
+    rate=float(os.getenv('RATE_LIMIT_PER_SECOND', '0.5')),
+    burst=int(os.getenv('RATE_LIMIT_BURST', '10'))
+)
+emergency_rate_limit_options = dict(
+    rate=float(os.getenv('EMERGENCY_RATE_LIMIT_PER_SECOND', '1.0')),
+    burst=int(os.getenv('EMERGENCY_RATE_LIMIT_BURST', '20'))
+)
+if shared_store:
+    rate_limiter = SharedRateLimiter(shared_store, **rate_limit_options)
+    emergency_rate_limiter = SharedRateLimiter(shared_store, **emergency_rate_limit_options)
+else:
+    rate_limiter = RateLimiter(max_keys=int(os.getenv('MAX_SESSIONS', '10000')), **rate_limit_options)
+    emergency_rate_limiter = RateLimiter(max_keys=int(os.getenv('MAX_SESSIONS', '10000')),
+                                         **emergency_rate_limit_options)
+
+# Conversation turns are written to SQLite in the background; set CONVERSATION_DB
+# to an empty string to keep conversations in memory only
+conversation_db = os.getenv('CONVERSATION_DB', os.path.join(app.root_path, 'Instance', 'conversations.db'))
+conversation_store = None
+if conversation_db:
+    try:
+        conversation_store = ConversationStore(conversation_db)
+        atexit.register(conversation_store.close)
+    except Exception as e:
+        logger.error(f"Failed to open conversation store, keeping conversations in memory: {str(e)}")
+
+# Each browser session gets its own bounded conversation state
+session_options = dict(
+    max_sessions=int(os.getenv('MAX_SESSIONS', '10000')),
+    ttl=int(os.getenv('SESSION_TTL', '1800')),
+    max_turns=int(os.getenv('SESSION_MAX_TURNS', '20')),
+    store=conversation_store
+)
+if shared_store:
+    session_manager = SharedSessionManager(shared_store, **session_options)
+else:
+    session_manager = SessionManager(**session_options)
+
+# Trip budget allocations are computed locally, so comparing many plans costs no model calls
+budget_engine = BudgetEngine()
+
+# Every bot is served from this process through /bots/<name>/chat and shares the
+# safety assistant's model client, so one connection pool, response cache and
+# upstream admission limit cover them all
+bot_registry = BotRegistry()
+bot_registry.register("safety", SafetyBot(assistant, session_manager))
+bot_registry.register("travel", TravelBot(
+    TravelBudgetBot(client=assistant.client, budget_engine=budget_engine,
+                    extractor=TripExtractor.from_file(DESTINATIONS_PATH)),
+    session_manager
+))
+
+# Request latency metrics, exposed with everything else on /metrics
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_seconds",
+    "Time spent handling each HTTP request, by endpoint and status",
+    ["endpoint", "status"]
+)
+SERIALIZE_SECONDS = REGISTRY.histogram(
+    "http_serialize_seconds",
+    "Time spent serializing JSON chat responses",
+    ["endpoint"]
+)
+
+REGISTRY.gauge("chat_active_sessions", "Sessions currently held in memory",
+               lambda: session_manager.stats()["active_sessions"])
+REGISTRY.gauge("chat_stored_bytes", "Approximate bytes of conversation text held in memory",
+               lambda: session_manager.stats()["stored_bytes"])
+REGISTRY.gauge("chat_buffered_responses", "Responses with undelivered chunks",
+               lambda: response_buffer.stats()["buffered_responses"])
+REGISTRY.gauge("response_cache_hits_total", "Response cache hits in memory and on disk",
+               lambda: response_cache.hits + response_cache.disk_hits, kind="counter")
+REGISTRY.gauge("response_cache_misses_total", "Response cache misses",
+               lambda: response_cache.misses, kind="counter")
+REGISTRY.gauge("llm_upstream_in_flight", "Requests holding an upstream slot",
+               lambda: assistant.client.admission.active)
+REGISTRY.gauge("llm_upstream_queue_depth", "Requests waiting for an upstream slot",
+               lambda: assistant.client.admission.queue_depth)
+REGISTRY.gauge("conversation_store_pending", "Conversation turns waiting for the background writer",
+               lambda: conversation_store.stats()["pending"] if conversation_store else 0)
+REGISTRY.gauge("chat_rate_limited_total", "Messages rejected by the per-session rate limit",
+               lambda: rate_limiter.limited, kind="counter")
+REGISTRY.gauge("chat_emergency_rate_limited_total", "Emergency messages rejected by the per-session emergency limit",
+               lambda: emergency_rate_limiter.limited, kind="counter")
+REGISTRY.gauge("llm_upstream_abandoned_running", "Upstream calls given up on at their deadline that are still running",
+               lambda: assistant.client.abandoned_running)
+REGISTRY.gauge("llm_coalesced_requests_total", "Requests answered by an identical in-flight call",
+               lambda: assistant.client.single_flight.coalesced, kind="counter")
+REGISTRY.gauge("llm_circuit_open", "1 while the upstream circuit breaker is rejecting calls",
+               lambda: int(assistant.client.breaker.state == "open"))
+REGISTRY.gauge("llm_upstream_ready", "1 once the model client is configured and warm",
+               lambda: int(assistant.upstream_ready()))
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.get('request_started')
+    if started is not None:
+        HTTP_SECONDS.observe(
+            time.perf_counter() - started,
+            endpoint=request.endpoint or 'unknown',
+            status=str(response.status_code)
+        )
+    return response
+
+def timed_jsonify(endpoint, payload):
+    started = time.perf_counter()
+    response = jsonify(payload)
+    SERIALIZE_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    return response
+
+def rate_limit_delay(session_id, user_message, emergency_lane=True):
+    """Seconds the session must wait before sending this message; 0 if it may be sent now
+    
+    Bots without an emergency path pass emergency_lane=False, so a message like
+    "help me plan a budget" only counts against the normal bucket.
+    """
+    if emergency_lane and assistant.is_emergency(user_message):
+        # Keyed apart from the normal bucket, which may live in the same shared table
+        return emergency_rate_limiter.check(f"emergency:{session_id}")
+    return rate_limiter.check(session_id)
+
+def rate_limited_response(delay):
+    response = jsonify({'response': "You're sending messages faster than I can answer. Please wait a moment and try again."})
+    response.headers['Retry-After'] = str(math.ceil(delay))
+    return response, 429
+
+DETAIL_ERROR_CHUNK = "Sorry, I couldn't load more detailed guidance. Please follow the steps above."
+
+def buffer_response(response, state=None):
+    """Move a reply's later chunks into the response buffer, leaving the JSON payload"""
+    detail = response.pop('detail', None)
+    remaining_chunks = response.pop('remaining_chunks', [])
+    if detail is not None:
+        response['response_id'] = response_buffer.put(remaining_chunks, complete=False)
+        detail_executor.submit(fill_detail, response['response_id'], detail, state)
+    elif remaining_chunks:
+        response['response_id'] = response_buffer.put(remaining_chunks)
+    return response
+
+def fill_detail(response_id, detail, state=None):
+    try:
+        chunks = detail()
+    except Exception as e:
+        logger.error(f"Error generating detailed response: {str(e)}")
+        chunks = [DETAIL_ERROR_CHUNK]
+    response_buffer.append(response_id, chunks)
+    # The detailed answer is part of the conversation, so publish it too
+    if state is not None:
+        save_session_state(state)
+
+def get_session_id():
+    session_id = session.get('session_id')
+    if not session_id:
+        session_id = secrets.token_urlsafe(16)
+        session['session_id'] = session_id
+    return session_id
+
+def get_session_state():
+    return session_manager.get(get_session_id())
+
+def save_session_state(state):
+    try:
+        session_manager.save(state)
+    except Exception as e:
+        logger.error(f"Error saving session state: {str(e)}")
 
 @app.route('/')
 def index():
@@ -28,38 +280,153 @@ def index():
 
 @app.route('/chat', methods=['POST'])
 def chat():
-    if assistant is None:
-        return jsonify({'response': 'Sorry, the safety assistant is currently unavailable. Please try again later.'}), 500
-    
     try:
         user_message = request.json.get('message')
         if not user_message:
             return jsonify({'response': 'Please provide a message.'}), 400
             
-        response = assistant.process_message(user_message)
-        return jsonify(response)
+        state = get_session_state()
+        delay = rate_limit_delay(state.session_id, user_message)
+        if delay:
+            return rate_limited_response(delay)
+        
+        response = assistant.process_message(user_message, state, defer_detail=True)
+        save_session_state(state)
+        return timed_jsonify('chat', buffer_response(response, state))
     except Exception as e:
         logger.error(f"Error processing chat message: {str(e)}")
         return jsonify({'response': 'Sorry, I encountered an error. Please try again.'}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    user_message = request.json.get('message')
+    if not user_message:
+        return jsonify({'response': 'Please provide a message.'}), 400
+    
+    state = get_session_state()
+    delay = rate_limit_delay(state.session_id, user_message)
+    if delay:
+        return rate_limited_response(delay)
+    
+    # Push each chunk to the client as a server-sent event as soon as it is ready
+    def generate():
+        try:
+            for chunk in assistant.stream_message(user_message, state):
+                yield f"data: {json.dumps({'chunk': chunk})}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming chat message: {str(e)}")
+            yield f"data: {json.dumps({'chunk': 'Sorry, I encountered an error. Please try again.'})}\n\n"
+        save_session_state(state)
+        yield "event: done\ndata: {}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/bots')
+def bots():
+    return jsonify({'bots': bot_registry.names()})
+
+@app.route('/bots/<name>/chat', methods=['POST'])
+def bot_chat(name):
+    try:
+        user_message = request.json.get('message')
+        if not user_message:
+            return jsonify({'response': 'Please provide a message.'}), 400
+        
+        session_id = get_session_id()
+        bot = bot_registry.get(name)
+        delay = rate_limit_delay(session_id, user_message, bot.handles_emergencies)
+        if delay:
+            return rate_limited_response(delay)
+        
+        response = bot_registry.chat(name, user_message, session_id)
+        return timed_jsonify('bot_chat', buffer_response(response))
+    except UnknownBot:
+        return jsonify({'response': f"Unknown bot '{name}'. Available bots: {', '.join(bot_registry.names())}"}), 404
+    except Exception as e:
+        logger.error(f"Error processing {name} bot message: {str(e)}")
+        return jsonify({'response': 'Sorry, I encountered an error. Please try again.'}), 500
+
+@app.route('/budget/compare', methods=['POST'])
+def budget_compare():
+    try:
+        data = request.json or {}
+        result = budget_engine.compare(
+            data.get('total_budget'),
+            durations=data.get('durations') or [None],
+            travelers=data.get('travelers') or [None],
+            profiles=data.get('profiles'),
+            committed=data.get('committed')
+        )
+        return timed_jsonify('budget_compare', result)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f"Invalid budget comparison: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"Error comparing budgets: {str(e)}")
+        return jsonify({'error': 'Sorry, I encountered an error. Please try again.'}), 500
+
 @app.route('/get_next_chunk', methods=['POST'])
 def get_next_chunk():
     try:
-        remaining_chunks = request.json.get('remaining_chunks', [])
-        if not remaining_chunks:
-            return jsonify({'chunk': '', 'has_more': False, 'remaining_chunks': []})
-            
-        next_chunk = remaining_chunks[0]
-        remaining = remaining_chunks[1:]
+        response_id = request.json.get('response_id')
+        if not response_id:
+            return jsonify({'chunk': '', 'has_more': False})
+        
+        result = response_buffer.next_chunk(response_id)
+        if result is None:
+            return jsonify({'chunk': '', 'has_more': False}), 404
         
-        return jsonify({
+        next_chunk, has_more = result
+        return timed_jsonify('get_next_chunk', {
             'chunk': next_chunk,
-            'has_more': len(remaining) > 0,
-            'remaining_chunks': remaining
+            'has_more': has_more,
+            'response_id': response_id
         })
     except Exception as e:
         logger.error(f"Error getting next chunk: {str(e)}")
-        return jsonify({'chunk': '', 'has_more': False, 'remaining_chunks': []}), 500
+        return jsonify({'chunk': '', 'has_more': False}), 500
+
+@app.route('/stats')
+def stats():
+    return jsonify({
+        'sessions': session_manager.stats(),
+        'response_buffer': response_buffer.stats(),
+        'response_cache': response_cache.stats(),
+        'rate_limiter': rate_limiter.stats(),
+        'emergency_rate_limiter': emergency_rate_limiter.stats(),
+        'conversation_store': conversation_store.stats() if conversation_store else {},
+        'model_client': assistant.client.stats(),
+        'retriever': assistant.retriever.stats() if assistant.retriever else {},
+        'context': assistant.context_manager.stats(),
+        'bots': bot_registry.stats()
+    })
+
+@app.route('/ready')
+def ready():
+    # Offline mode still answers, so only a client that is still warming up is not ready
+    if assistant.upstream_ready():
+        upstream = 'warm'
+    elif assistant.upstream_available():
+        # With MODEL_WARMUP=0 nothing configures the client until the first model
+        # call, which a readiness-gated load balancer never sends, so start it here
+        assistant.start_warm_up()
+        upstream = 'warming'
+    else:
+        upstream = 'offline'
+    
+    return jsonify({
+        'ready': upstream != 'warming',
+        'upstream': upstream,
+        'backend': assistant.backend.name,
+        'error': getattr(assistant.backend, 'error', None)
+    }), 503 if upstream == 'warming' else 200
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""ASGI entry point that serves /chat asynchronously alongside the Flask app.
+
+Chat requests await the model call on the event loop, so an open chat no
+longer holds a worker thread while Gemini responds. Every other route is
+handed to the Flask app unchanged.
+
+Run with: uvicorn asgi:application
+"""
+import asyncio
+import json
+import math
+import secrets
+import logging
+from http.cookies import SimpleCookie
+from asgiref.wsgi import WsgiToAsgi
+from app import DETAIL_ERROR_CHUNK, app, assistant, rate_limit_delay, response_buffer, save_session_state, session_manager
+
+logger = logging.getLogger(__name__)
+
+flask_application = WsgiToAsgi(app)
+
+# Share the Flask session cookie so both paths see the same conversation
+session_serializer = app.session_interface.get_signing_serializer(app)
+session_cookie_name = app.config['SESSION_COOKIE_NAME']
+
+# Keeps deferred emergency answers referenced until they finish
+detail_tasks = set()
+
+
+async def read_json(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return json.loads(body or b'{}')
+
+
+async def send_json(send, status, payload, headers=None):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii'))
+        ] + (headers or [])
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def get_session_id(scope):
+    """Return the chat session id stored in the signed Flask session cookie, if any"""
+    for name, value in scope.get('headers', []):
+        if name != b'cookie':
+            continue
+        morsel = SimpleCookie(value.decode('latin-1')).get(session_cookie_name)
+        if morsel is None:
+            continue
+        try:
+            return session_serializer.loads(morsel.value).get('session_id')
+        except Exception:
+            return None
+    return None
+
+
+async def chat(scope, receive, send):
+    try:
+        user_message = (await read_json(receive)).get('message')
+    except (ValueError, AttributeError):
+        user_message = None
+    if not user_message:
+        await send_json(send, 400, {'response': 'Please provide a message.'})
+        return
+
+    headers = []
+    session_id = get_session_id(scope)
+    if not session_id:
+        session_id = secrets.token_urlsafe(16)
+        cookie = session_serializer.dumps({'session_id': session_id})
+        headers.append((b'set-cookie', f'{session_cookie_name}={cookie}; Path=/; HttpOnly; SameSite=Lax'.encode('latin-1')))
+
+    # Sessions, rate limits and response buffers may sit in SQLite, so they are
+    # read and written on a worker thread rather than on the event loop
+    delay = await asyncio.to_thread(rate_limit_delay, session_id, user_message)
+    if delay:
+        await send_json(
+            send, 429,
+            {'response': "You're sending messages faster than I can answer. Please wait a moment and try again."},
+            headers + [(b'retry-after', str(math.ceil(delay)).encode('ascii'))]
+        )
+        return
+
+    try:
+        state = await asyncio.to_thread(session_manager.get, session_id)
+        response = await assistant.aprocess_message(user_message, state, defer_detail=True)
+        await asyncio.to_thread(save_session_state, state)
+        detail = response.pop('detail', None)
+        remaining_chunks = response.pop('remaining_chunks', [])
+        if detail is not None:
+            response['response_id'] = await asyncio.to_thread(response_buffer.put, remaining_chunks, False)
+            task = asyncio.create_task(fill_detail(response['response_id'], detail, state))
+            detail_tasks.add(task)
+            task.add_done_callback(detail_tasks.discard)
+        elif remaining_chunks:
+            response['response_id'] = await asyncio.to_thread(response_buffer.put, remaining_chunks)
+        await send_json(send, 200, response, headers)
+    except Exception as e:
+        logger.error(f"Error processing chat message: {str(e)}")
+        await send_json(send, 500, {'response': 'Sorry, I encountered an error. Please try again.'})
+
+
+async def fill_detail(response_id, detail, state):
+    try:
+        chunks = await detail()
+    except Exception as e:
+        logger.error(f"Error generating detailed response: {str(e)}")
+        chunks = [DETAIL_ERROR_CHUNK]
+    await asyncio.to_thread(response_buffer.append, response_id, chunks)
+    await asyncio.to_thread(save_session_state, state)
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(scope, receive, send)
+    elif scope['type'] == 'http' and scope['path'] == '/chat' and scope['method'] == 'POST':
+        await chat(scope, receive, send)
+    else:
+        await flask_application(scope, receive, send)
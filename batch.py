@@ -0,0 +1,244 @@
+"""Run a JSONL file of messages through a chatbot with a bounded worker pool.
+
+Each input line is a JSON object with a "message" and optionally an "id" and a
+"session_id". Lines sharing a session_id are answered in order as one
+conversation; all other lines run concurrently. Results are written to the
+output JSONL in input order, and a checkpoint next to the output lets an
+interrupted run carry on where it stopped.
+
+Run with: python batch.py prompts.jsonl results.jsonl --bot safety --workers 32
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+from safety_assistant import SafetyAssistant
+from session_manager import ConversationState
+from chatbot import DESTINATIONS_PATH, TravelBudgetBot
+from budget_engine import BudgetEngine
+from trip_extractor import TripExtractor
+from llm_backend import create_backend
+from response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+class SafetyRunner:
+    """Answer batch lines with one SafetyAssistant and a conversation state per session"""
+
+    def __init__(self, workers):
+        # One upstream slot per worker, so batch lines are never shed by admission control
+        self.assistant = SafetyAssistant(cache=ResponseCache(max_entries=10000), max_concurrency=workers)
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def answer(self, message, session_id=None):
+        if session_id is None:
+            state = ConversationState()
+        else:
+            with self._lock:
+                state = self._states.setdefault(session_id, ConversationState(session_id))
+        result = self.assistant.process_message(message, state)
+        return '\n'.join([result["chunk"]] + result["remaining_chunks"])
+
+
+class TravelRunner:
+    """Answer batch lines with one TravelBudgetBot, keeping trip details per session"""
+
+    def __init__(self, workers):
+        self.bot = TravelBudgetBot(backend=create_backend(), cache=ResponseCache(max_entries=10000),
+                                   budget_engine=BudgetEngine(),
+                                   extractor=TripExtractor.from_file(DESTINATIONS_PATH))
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def answer(self, message, session_id=None):
+        if session_id is None:
+            state = ConversationState()
+        else:
+            with self._lock:
+                state = self._states.setdefault(session_id, ConversationState(session_id))
+        return self.bot.process_message(message, state)
+
+
+RUNNERS = {"safety": SafetyRunner, "travel": TravelRunner}
+
+
+class BatchRunner:
+    """Answer every line of an input JSONL and write the results in order, with a resumable checkpoint"""
+
+    def __init__(self, runner, workers=16, checkpoint_every=100):
+        self.runner = runner
+        self.workers = workers
+        self.checkpoint_every = checkpoint_every  # Lines written between checkpoints
+        # Lines read ahead of the oldest unfinished one; bounds memory on huge inputs
+        self.window = workers * 4
+        # (input lines done, output bytes written for them), assigned together so a
+        # checkpoint taken after an interrupt never splits a line
+        self.progress = (0, 0)
+        self.errors = 0
+
+    def run(self, input_path, output_path, checkpoint_path=None, restart=False):
+        """Process input_path into output_path; return the number of lines answered in this run"""
+        checkpoint_path = checkpoint_path or output_path + '.checkpoint'
+        checkpoint = None if restart else self.load_checkpoint(checkpoint_path, input_path, output_path)
+        skip = checkpoint["completed"] if checkpoint else 0
+
+        # Drop anything written after the last checkpoint so no result is duplicated
+        output = open(output_path, 'r+b' if checkpoint else 'wb')
+        output.seek(checkpoint["output_bytes"] if checkpoint else 0)
+        output.truncate()
+        if skip:
+            logger.info(f"Resuming after line {skip} of {input_path}")
+
+        self.progress = (skip, checkpoint["output_bytes"] if checkpoint else 0)
+        answered = 0
+        started = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='batch')
+        pending = deque()  # (line number, future or ready record), in input order
+        last_in_session = {}
+
+        def write_next():
+            nonlocal answered
+            number, item = pending.popleft()
+            record = item.result() if isinstance(item, Future) else item
+            session_id = record.get("session_id") if record else None
+            if session_id is not None and last_in_session.get(session_id) is item:
+                del last_in_session[session_id]
+            data = b''
+            if record is not None:
+                data = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+                output.write(data)
+                answered += 1
+                self.errors += "error" in record
+            self.progress = (number, self.progress[1] + len(data))
+            if number % self.checkpoint_every == 0:
+                self.save_checkpoint(checkpoint_path, input_path, output)
+                rate = answered / (time.perf_counter() - started)
+                logger.info(f"{number} lines done, {rate:.1f} lines/s")
+
+        try:
+            with open(input_path, encoding='utf-8') as lines:
+                for number, line in enumerate(lines, 1):
+                    if number <= skip:
+                        continue
+                    pending.append((number, self.submit(pool, number, line, last_in_session)))
+                    while len(pending) >= self.window:
+                        write_next()
+            while pending:
+                write_next()
+        except BaseException as e:
+            # Keep everything written so far; rerunning the command resumes from here
+            if isinstance(e, KeyboardInterrupt):
+                logger.warning(f"Interrupted; rerun the same command to resume after line {self.progress[0]}")
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.save_checkpoint(checkpoint_path, input_path, output)
+            output.close()
+            raise
+
+        pool.shutdown()
+        output.close()
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Answered {answered} lines in {elapsed:.1f}s with {self.errors} errors")
+        return answered
+
+    def submit(self, pool, number, line, last_in_session):
+        """Start answering one input line; blank lines give None and bad lines an error record"""
+        if not line.strip():
+            return None
+        try:
+            row = json.loads(line)
+            message = row["message"]
+        except (ValueError, KeyError, TypeError) as e:
+            return {"id": number, "error": f"Invalid input line: {str(e)}"}
+
+        session_id = row.get("session_id")
+        previous = last_in_session.get(session_id) if session_id is not None else None
+        future = pool.submit(self.answer, row.get("id", number), message, session_id, previous)
+        if session_id is not None:
+            last_in_session[session_id] = future
+        return future
+
+    def answer(self, line_id, message, session_id, previous):
+        # The pool runs work in submission order, so the previous turn is already running or done
+        if previous is not None:
+            previous.result()
+        record = {"id": line_id, "message": message}
+        if session_id is not None:
+            record["session_id"] = session_id
+        started = time.perf_counter()
+        try:
+            record["response"] = self.runner.answer(message, session_id)
+        except Exception as e:
+            logger.error(f"Error answering line {line_id}: {str(e)}")
+            record["error"] = str(e)
+        record["seconds"] = round(time.perf_counter() - started, 4)
+        return record
+
+    def load_checkpoint(self, path, input_path, output_path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable checkpoint {path}: {str(e)}")
+            return None
+        if checkpoint.get("input") != os.path.abspath(input_path):
+            logger.warning(f"Checkpoint {path} was written for {checkpoint.get('input')}, starting over")
+            return None
+        # The output may have been moved, deleted or cut short since the checkpoint was taken
+        if not os.path.exists(output_path):
+            logger.warning(f"Checkpoint {path} refers to missing output {output_path}, starting over")
+            return None
+        size = os.path.getsize(output_path)
+        if size < checkpoint.get("output_bytes", 0):
+            logger.warning(f"Output {output_path} has {size} bytes but checkpoint {path} "
+                           f"expects {checkpoint['output_bytes']}, starting over")
+            return None
+        return checkpoint
+
+    def save_checkpoint(self, path, input_path, output):
+        """Record how far the output is complete, replacing the old checkpoint atomically"""
+        completed, output_bytes = self.progress
+        output.flush()
+        checkpoint = {
+            "input": os.path.abspath(input_path),
+            "completed": completed,
+            "output_bytes": output_bytes
+        }
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f)
+        os.replace(temp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of messages with one of the chatbots")
+    parser.add_argument('input', help="JSONL file with one {\"message\": ...} object per line")
+    parser.add_argument('output', help="JSONL file the answers are written to, in input order")
+    parser.add_argument('--bot', choices=sorted(RUNNERS), default='safety')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('BATCH_WORKERS', '16')))
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: OUTPUT.checkpoint)")
+    parser.add_argument('--checkpoint-every', type=int, default=100, help="Lines written between checkpoints")
+    parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint and start over")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    workers = max(args.workers, 1)
+    batch = BatchRunner(RUNNERS[args.bot](workers), workers=workers, checkpoint_every=max(args.checkpoint_every, 1))
+    try:
+        batch.run(args.input, args.output, args.checkpoint, restart=args.restart)
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+
+if __name__ == '__main__':
+    main()
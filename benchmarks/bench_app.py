@@ -0,0 +1,238 @@
+"""End-to-end load benchmark for the /chat and /get_next_chunk endpoints.
+
+Serves app.py in-process against the offline stub backend and drives it
+over HTTP from concurrent clients. Each client sends a message picked from
+a weighted mix, then drains the remaining chunks. While a deferred
+emergency answer is still being generated, /get_next_chunk returns an
+empty chunk; clients back off before polling again and those empty polls
+are reported apart from chunk latency.
+
+Run from the repository root, for example:
+    python benchmarks/bench_app.py --concurrency 32 --duration 20 --latency 0.8
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.request
+from http.cookiejar import CookieJar
+
+from common import current_rss_bytes, summarize, write_results
+
+MESSAGES = {
+    "emergency": [
+        "There is a fire in my building, what do I do?",
+        "Emergency! Someone collapsed on the street",
+        "I feel unsafe walking home, I need help",
+        "Danger, there is a gas smell in the kitchen"
+    ],
+    "health": [
+        "What are the basic first aid steps?",
+        "Medical advice for a high fever in a child",
+        "How do I stay healthy during flu season?",
+        "Health precautions for a long flight"
+    ],
+    "tips": [
+        "Give me fire safety tips",
+        "What are some home safety guidelines?",
+        "Road safety tips for new drivers",
+        "Cyber security advice for my parents"
+    ],
+    "general": [
+        "How can I stay safe while traveling?",
+        "What should I keep in my car for winter trips?",
+        "How do I teach my kids about strangers?",
+        "Is it safe to jog early in the morning?"
+    ]
+}
+
+
+def parse_mix(text):
+    """Parse a mix such as "emergency=1,health=2,tips=2,general=5" into weights"""
+    weights = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in MESSAGES:
+            raise ValueError(f"Unknown message category: {name}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def run_client(base_url, deadline, weights, unique, rng, counter, results, lock, poll_interval, max_poll_interval):
+    """Send messages until the deadline, recording per-request latencies"""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    categories = list(weights)
+    category_weights = [weights[name] for name in categories]
+
+    def post(path, payload):
+        request = urllib.request.Request(
+            base_url + path,
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        with opener.open(request, timeout=60) as response:
+            return json.loads(response.read())
+
+    while time.perf_counter() < deadline:
+        category = rng.choices(categories, category_weights)[0]
+        message = rng.choice(MESSAGES[category])
+        if unique:
+            # Distinct messages keep the response cache from hiding upstream latency
+            with lock:
+                counter[0] += 1
+                message = f"{message} (request {counter[0]})"
+
+        started = time.perf_counter()
+        try:
+            data = post('/chat', {'message': message})
+            first_chunk = time.perf_counter() - started
+
+            chunk_latencies = []
+            empty_polls = []
+            delay = poll_interval
+            while data.get('has_more'):
+                chunk_started = time.perf_counter()
+                data = post('/get_next_chunk', {'response_id': data['response_id']})
+                if data.get('chunk') or not data.get('has_more'):
+                    chunk_latencies.append(time.perf_counter() - chunk_started)
+                    delay = poll_interval
+                    continue
+                # Nothing ready yet: wait, backing off up to max_poll_interval, as a browser would
+                empty_polls.append(time.perf_counter() - chunk_started)
+                time.sleep(delay)
+                delay = min(delay * 2, max_poll_interval)
+            total = time.perf_counter() - started
+        except Exception as e:
+            with lock:
+                results["errors"] += 1
+                results["error_samples"] = (results["error_samples"] + [str(e)])[-5:]
+            continue
+
+        with lock:
+            results["chat"][category].append(first_chunk)
+            results["full_response"].append(total)
+            results["next_chunk"].extend(chunk_latencies)
+            results["empty_poll"].extend(empty_polls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds to run after warm-up')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds of unrecorded warm-up')
+    parser.add_argument('--mix', default='emergency=1,health=2,tips=2,general=5', help='message mix weights')
+    parser.add_argument('--latency', type=float, default=1.0, help='mean simulated model latency in seconds')
+    parser.add_argument('--latency-stddev', type=float, default=0.3)
+    parser.add_argument('--distribution', default='lognormal', choices=['fixed', 'uniform', 'normal', 'lognormal'])
+    parser.add_argument('--error-rate', type=float, default=0.0, help='simulated upstream error rate')
+    parser.add_argument('--repeat-messages', action='store_true', help='let identical messages hit the cache')
+    parser.add_argument('--poll-interval', type=float, default=0.05,
+                        help='seconds to wait after an empty chunk before polling again')
+    parser.add_argument('--max-poll-interval', type=float, default=0.5, help='cap on the poll backoff in seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_app_results.json', help='JSON results path')
+    args = parser.parse_args()
+
+    # The app reads its configuration at import time
+    os.environ['LLM_BACKEND'] = 'stub'
+    os.environ['STUB_LATENCY_MEAN'] = str(args.latency)
+    os.environ['STUB_LATENCY_STDDEV'] = str(args.latency_stddev)
+    os.environ['STUB_LATENCY_DISTRIBUTION'] = args.distribution
+    os.environ['STUB_ERROR_RATE'] = str(args.error_rate)
+    os.environ['STUB_SEED'] = str(args.seed)
+    os.environ['RESPONSE_CACHE_DB'] = ''
+    # Persist conversations as in production, but to a throwaway file
+    os.environ.setdefault('CONVERSATION_DB', os.path.join(tempfile.mkdtemp(), 'conversations.db'))
+    # Each client sends as fast as it can, so lift the per-session rate limits,
+    # including the separate bucket emergency messages draw on
+    os.environ['RATE_LIMIT_PER_SECOND'] = '1000000'
+    os.environ['EMERGENCY_RATE_LIMIT_PER_SECOND'] = '1000000'
+    os.environ['EMERGENCY_RATE_LIMIT_BURST'] = '1000000'
+    os.environ['UPSTREAM_QUEUE_SIZE'] = str(max(64, args.concurrency))
+
+    import logging
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    weights = parse_mix(args.mix)
+    lock = threading.Lock()
+    counter = [0]
+
+    def run_phase(seconds):
+        results = {
+            "chat": {name: [] for name in MESSAGES},
+            "full_response": [],
+            "next_chunk": [],
+            "empty_poll": [],
+            "errors": 0,
+            "error_samples": []
+        }
+        deadline = time.perf_counter() + seconds
+        threads = [
+            threading.Thread(target=run_client, args=(
+                base_url, deadline, weights, not args.repeat_messages,
+                random.Random(args.seed + index), counter, results, lock,
+                args.poll_interval, args.max_poll_interval
+            ))
+            for index in range(args.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    print(f"Warming up for {args.warmup}s...")
+    run_phase(args.warmup)
+
+    rss_before = current_rss_bytes()
+    print(f"Running {args.concurrency} clients for {args.duration}s...")
+    started = time.perf_counter()
+    results = run_phase(args.duration)
+    elapsed = time.perf_counter() - started
+    rss_after = current_rss_bytes()
+    server.shutdown()
+
+    all_chat = [value for values in results["chat"].values() for value in values]
+    report = {
+        "requests": len(all_chat),
+        "errors": results["errors"],
+        "error_samples": results["error_samples"],
+        "elapsed_s": round(elapsed, 3),
+        "chat_requests_per_s": round(len(all_chat) / elapsed, 2),
+        "http_requests_per_s": round(
+            (len(all_chat) + len(results["next_chunk"]) + len(results["empty_poll"])) / elapsed, 2
+        ),
+        "chat_latency": summarize(all_chat),
+        "chat_latency_by_category": {name: summarize(values) for name, values in results["chat"].items() if values},
+        "full_response_latency": summarize(results["full_response"]),
+        "next_chunk_latency": summarize(results["next_chunk"]),
+        "empty_polls": len(results["empty_poll"]),
+        "empty_poll_latency": summarize(results["empty_poll"]),
+        "rss_before_bytes": rss_before,
+        "rss_after_bytes": rss_after,
+        "rss_growth_bytes": rss_after - rss_before
+    }
+
+    print(f"chat: {report['chat_requests_per_s']} req/s, "
+          f"p50 {report['chat_latency']['p50_ms']} ms, p99 {report['chat_latency']['p99_ms']} ms, "
+          f"errors {report['errors']}")
+    print(f"get_next_chunk: p50 {report['next_chunk_latency']['p50_ms']} ms, "
+          f"p99 {report['next_chunk_latency']['p99_ms']} ms, {report['empty_polls']} empty polls")
+    print(f"RSS growth: {report['rss_growth_bytes'] / 1024:.0f} KiB")
+
+    write_results(args.output, "app", vars(args), report)
+
+
+if __name__ == '__main__':
+    main()
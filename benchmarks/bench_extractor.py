@@ -0,0 +1,87 @@
+"""Throughput benchmark for TripExtractor against per-slot regexes and a linear gazetteer scan.
+
+Run from the repository root: python benchmarks/bench_extractor.py
+"""
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trip_extractor import TripExtractor
+
+DESTINATIONS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'destinations.txt')
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "qu", "bri", "sto", "fla"]
+
+TEMPLATES = [
+    "We are {people} people going to {place} for {days} days, budget is ${budget}k",
+    "Planning a trip to {place} with my wife, can we afford it on {budget} thousand rupees?",
+    "family of {people} from Delhi to {place} for {days} nights, what should we pack",
+    "Is {place} safe to visit alone? I have about {budget}k euros and a fortnight",
+    "Give me some local tips for the weekend, nothing about money please"
+]
+
+# The separate patterns a naive extractor runs one after another
+NAIVE_PATTERNS = [
+    re.compile(r'(\d+)\s*(?:k|thousand)\b', re.IGNORECASE),
+    re.compile(r'[$€£₹]\s?(\d+)', re.IGNORECASE),
+    re.compile(r'(\d+)\s*(days?|nights?|weeks?)\b', re.IGNORECASE),
+    re.compile(r'(\d+)\s+(?:people|persons|of us|travell?ers)\b', re.IGNORECASE),
+    re.compile(r'family of (\d+)', re.IGNORECASE),
+    re.compile(r'\b(?:solo|alone)\b', re.IGNORECASE)
+]
+
+
+def load_gazetteer(extra, rng):
+    destinations = TripExtractor.from_file(DESTINATIONS_PATH).destinations
+    while len(destinations) < extra:
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        destinations.setdefault(name, name.capitalize())
+    return destinations
+
+
+def make_messages(count, destinations, rng):
+    places = list(destinations)
+    return [
+        rng.choice(TEMPLATES).format(
+            people=rng.randint(1, 6), place=rng.choice(places).title(), days=rng.randint(2, 20),
+            budget=rng.randint(1, 9)
+        )
+        for _ in range(count)
+    ]
+
+
+def naive_extract(message, destinations):
+    lowered = message.lower()
+    found = [pattern.search(message) for pattern in NAIVE_PATTERNS]
+    place = next((name for name in destinations if name in lowered), None)
+    return found, place
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'destinations':>13} {'naive msg/s':>12} {'extractor msg/s':>16} {'speedup':>8}")
+
+    for size in (0, 1000, 5000):
+        destinations = load_gazetteer(size, rng)
+        extractor = TripExtractor(destinations)
+        messages = make_messages(500, destinations, rng)
+
+        def run_naive():
+            for message in messages:
+                naive_extract(message, destinations)
+
+        def run_extractor():
+            for message in messages:
+                extractor.extract(message)
+
+        naive = min(timeit.repeat(run_naive, number=1, repeat=3)) / len(messages)
+        extracted = min(timeit.repeat(run_extractor, number=1, repeat=3)) / len(messages)
+        print(f"{len(destinations):>13} {1 / naive:>12,.0f} {1 / extracted:>16,.0f} {naive / extracted:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
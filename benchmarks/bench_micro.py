@@ -0,0 +1,78 @@
+"""Micro-benchmarks for chunk_response, message routing and get_varied_question.
+
+Run from the repository root: python benchmarks/bench_micro.py
+"""
+import argparse
+import timeit
+
+from common import summarize, write_results
+
+from llm_backend import StubBackend
+from response_cache import ResponseCache
+from safety_assistant import SafetyAssistant
+from session_manager import ConversationState
+
+ROUTING_MESSAGES = [
+    "I need emergency help, there is smoke everywhere",
+    "Give me some fire safety tips for my apartment",
+    "What first aid should I know for burns?",
+    "How can I stay safe while traveling alone at night in a new city?",
+    "hello"
+]
+
+
+def make_response(lines):
+    return '\n'.join(
+        f"- Subpoint {number}: ✅ Practical safety step {number}, described in a sentence or two."
+        for number in range(lines)
+    )
+
+
+def measure(function, number, repeat):
+    """Return per-call timings in seconds for each repeat"""
+    return [total / number for total in timeit.repeat(function, number=number, repeat=repeat)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--output', default='bench_micro_results.json', help='JSON results path')
+    args = parser.parse_args()
+
+    assistant = SafetyAssistant(backend=StubBackend(latency_mean=0), cache=ResponseCache())
+    state = ConversationState()
+    results = {}
+
+    for lines in (10, 100, 1000):
+        response = make_response(lines)
+        results[f"chunk_response_{lines}_lines"] = summarize(
+            measure(lambda: assistant.chunk_response(response), max(1, 20000 // lines), args.repeat), unit="us"
+        )
+
+    for message in ROUTING_MESSAGES:
+        results[f"route:{message[:30]}"] = summarize(
+            measure(lambda: assistant.router.route(message), 20000, args.repeat), unit="us"
+        )
+    long_message = ' '.join(ROUTING_MESSAGES * 40)
+    results["route_long_message"] = summarize(
+        measure(lambda: assistant.router.route(long_message), 2000, args.repeat), unit="us"
+    )
+
+    if assistant.retriever is not None:
+        results["retriever_search"] = summarize(
+            measure(lambda: assistant.retriever.search(ROUTING_MESSAGES[3]), 5000, args.repeat), unit="us"
+        )
+
+    results["get_varied_question"] = summarize(
+        measure(lambda: assistant.get_varied_question(state), 50000, args.repeat), unit="us"
+    )
+
+    width = max(len(name) for name in results)
+    for name, summary in results.items():
+        print(f"{name:<{width}}  mean {summary['mean_us']:9.2f} us  p50 {summary['p50_us']:9.2f} us")
+
+    write_results(args.output, "micro", vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Micro-benchmark for IntentRouter against the linear keyword scans it replaced.
+
+Run from the repository root: python benchmarks/bench_router.py
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_router import IntentRouter
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "qu", "bri", "sto", "fla"]
+
+
+def make_keywords(count, rng):
+    keywords = set()
+    while len(keywords) < count:
+        keywords.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(keywords)
+
+
+def make_message(length, words, rng):
+    filler = ["the", "a", "when", "should", "i", "my", "safe", "near", "house", "road", "please"]
+    parts = []
+    while sum(len(part) + 1 for part in parts) < length:
+        parts.append(rng.choice(words) if rng.random() < 0.02 else rng.choice(filler))
+    return ' '.join(parts)
+
+
+def linear_route(message, intents):
+    message = message.lower()
+    for intent, keywords in intents:
+        if any(keyword in message for keyword in keywords):
+            return intent
+    return None
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'keywords':>9} {'msg chars':>10} {'linear us':>10} {'router us':>10} {'speedup':>8}")
+
+    for keyword_count in (12, 100, 1000, 5000):
+        keywords = make_keywords(keyword_count, rng)
+        third = len(keywords) // 3
+        intents = [
+            ("emergency", keywords[:third]),
+            ("tips", keywords[third:2 * third]),
+            ("health", keywords[2 * third:])
+        ]
+        router = IntentRouter(intents)
+
+        for length in (200, 5000):
+            # Messages without any keyword are the worst case for the linear scan
+            message = make_message(length, ["nothing"], rng)
+            number = max(1, 20000 // (keyword_count * length // 200 + 1))
+
+            linear = min(timeit.repeat(lambda: linear_route(message, intents), number=number, repeat=3)) / number
+            routed = min(timeit.repeat(lambda: router.route(message), number=number, repeat=3)) / number
+            print(f"{keyword_count:>9} {length:>10} {linear * 1e6:>10.1f} {routed * 1e6:>10.1f} {linear / routed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
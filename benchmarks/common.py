@@ -0,0 +1,67 @@
+"""Helpers shared by the benchmark scripts."""
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def percentile(values, fraction):
+    """Return the value at the given fraction (0-1) of the sorted values, interpolated"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values, unit="ms"):
+    """Summarize a list of durations in seconds, reported in ms or us"""
+    scale = {"ms": 1e3, "us": 1e6}[unit]
+
+    def scaled(value):
+        return round(value * scale, 3)
+
+    return {
+        "count": len(values),
+        f"mean_{unit}": scaled(sum(values) / len(values)) if values else 0.0,
+        f"p50_{unit}": scaled(percentile(values, 0.50)),
+        f"p90_{unit}": scaled(percentile(values, 0.90)),
+        f"p99_{unit}": scaled(percentile(values, 0.99)),
+        f"max_{unit}": scaled(max(values)) if values else 0.0
+    }
+
+
+def current_rss_bytes():
+    """Resident set size of this process, falling back to the peak on non-Linux systems"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def write_results(path, name, config, results):
+    """Write a machine-readable benchmark run so runs can be compared later"""
+    document = {
+        "benchmark": name,
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": results
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+    print(f"Results written to {path}")
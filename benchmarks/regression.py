@@ -0,0 +1,194 @@
+"""Deterministic performance regression check for SafetyAssistant.process_message.
+
+Model calls are replayed from a cassette, so only our own routing, prompt
+building and chunking is measured and no network access is needed.
+
+Record the cassette once (uses LLM_BACKEND, Gemini by default):
+    python benchmarks/regression.py --record
+Store a baseline on the reference commit, then compare on a change:
+    python benchmarks/regression.py --update-baseline
+    python benchmarks/regression.py
+The comparison exits with status 1 when a handler got slower or allocates
+more than the tolerances allow.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from common import ROOT, summarize, write_results
+
+from cassette import Cassette, RecordingBackend, ReplayBackend
+from llm_backend import create_backend
+from response_cache import ResponseCache
+from safety_assistant import SafetyAssistant
+from session_manager import ConversationState
+
+CASSETTE_PATH = os.path.join(ROOT, 'benchmarks', 'cassettes', 'safety_assistant.jsonl')
+
+# One or more messages for every handler process_message can pick
+MESSAGES = [
+    "Help, there is a fire in my kitchen!",
+    "Emergency, my neighbour collapsed and is not breathing",
+    "I smell gas in the house, what do I do right now?",
+    "What are the symptoms of heat stroke?",
+    "How do I treat a minor burn at home?",
+    "I have a fever and headache, should I be worried?",
+    "Is it a medical problem if I keep getting nosebleeds?",
+    "What are good health habits for night shift workers?",
+    "Give me some fire safety tips for my apartment",
+    "Any road safety tips for cycling to work?",
+    "cyber security tips for online banking",
+    "How should I store cleaning chemicals safely?",
+    "How can I stay safe while travelling alone at night in a new city?",
+    "What should be in a home emergency kit?",
+    "Is it safe to use my phone while it is charging in the bathroom?",
+    "How do I teach my kids to cross the road safely?",
+    "What should I do if my car breaks down on the highway at night?",
+    "hello"
+]
+
+
+def build_assistant(backend):
+    # Nothing is kept in the cache, so every repeat runs the full upstream path
+    return SafetyAssistant(backend=backend, cache=ResponseCache(max_entries=0))
+
+
+def handler_for(assistant, message):
+    """Name of the handler process_message will use for a message"""
+    return assistant.plan_response(message, ConversationState())[0]
+
+
+def record(args):
+    cassette = Cassette(args.cassette)
+    assistant = build_assistant(RecordingBackend(create_backend(), cassette))
+    for message in MESSAGES:
+        random.seed(args.seed)
+        assistant.process_message(message, ConversationState())
+    print(f"Recorded {cassette.recorded} responses to {args.cassette}")
+
+
+def measure(args):
+    """Return per-handler latency and memory for replayed messages"""
+    cassette = Cassette(args.cassette)
+    backend = ReplayBackend(cassette, latency_scale=args.latency_scale)
+    assistant = build_assistant(backend)
+    handlers = {message: handler_for(assistant, message) for message in MESSAGES}
+
+    def run(message):
+        random.seed(args.seed)
+        assistant.process_message(message, ConversationState())
+
+    # Warm up imports, compiled patterns and caches before timing
+    for message in MESSAGES:
+        run(message)
+
+    timings = {}
+    for _ in range(args.repeat):
+        for message in MESSAGES:
+            started = time.perf_counter()
+            run(message)
+            timings.setdefault(handlers[message], []).append(time.perf_counter() - started)
+
+    # Memory is measured separately because tracing slows every allocation down
+    memory = {}
+    tracemalloc.start()
+    for message in MESSAGES:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        start_size = tracemalloc.get_traced_memory()[0]
+        run(message)
+        peak = tracemalloc.get_traced_memory()[1] - start_size
+        after = tracemalloc.take_snapshot()
+        blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+        memory.setdefault(handlers[message], []).append((peak, blocks))
+    tracemalloc.stop()
+
+    if backend.misses:
+        sys.exit(f"{backend.misses} prompts were not in {args.cassette}; record it again with --record")
+
+    results = {}
+    for handler, values in sorted(timings.items()):
+        samples = memory[handler]
+        results[handler] = dict(
+            summarize(values, unit="us"),
+            peak_kib=round(sum(peak for peak, _ in samples) / len(samples) / 1024, 1),
+            allocated_blocks=round(sum(blocks for _, blocks in samples) / len(samples), 1)
+        )
+    return results
+
+
+def compare(results, baseline, args):
+    """Print each handler against the baseline and return the regressions found"""
+    regressions = []
+    print(f"{'handler':<10} {'p50 us':>9} {'base':>9} {'change':>8} {'peak KiB':>9} {'base':>7} "
+          f"{'blocks':>7} {'base':>7}")
+    for handler, current in results.items():
+        base = baseline.get(handler)
+        if base is None:
+            print(f"{handler:<10} {current['p50_us']:>9.1f} {'-':>9} {'new':>8} {current['peak_kib']:>9.1f} "
+                  f"{'-':>7} {current['allocated_blocks']:>7.1f} {'-':>7}")
+            continue
+        change = current['p50_us'] / base['p50_us'] - 1 if base['p50_us'] else 0.0
+        print(f"{handler:<10} {current['p50_us']:>9.1f} {base['p50_us']:>9.1f} {change:>+8.0%} "
+              f"{current['peak_kib']:>9.1f} {base['peak_kib']:>7.1f} "
+              f"{current['allocated_blocks']:>7.1f} {base['allocated_blocks']:>7.1f}")
+
+        # Small absolute slack keeps microsecond-level noise from failing the check
+        if current['p50_us'] > base['p50_us'] * (1 + args.time_tolerance) + args.time_slack_us:
+            regressions.append(f"{handler}: p50 {base['p50_us']:.1f}us -> {current['p50_us']:.1f}us")
+        if current['peak_kib'] > base['peak_kib'] * (1 + args.memory_tolerance) + 1:
+            regressions.append(f"{handler}: peak memory {base['peak_kib']:.1f}KiB -> {current['peak_kib']:.1f}KiB")
+        if current['allocated_blocks'] > base['allocated_blocks'] * (1 + args.memory_tolerance) + 5:
+            regressions.append(f"{handler}: allocated blocks {base['allocated_blocks']:.1f} -> "
+                               f"{current['allocated_blocks']:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cassette', default=CASSETTE_PATH)
+    parser.add_argument('--baseline', default='bench_regression_baseline.json', help='stored baseline path')
+    parser.add_argument('--output', default='bench_regression_results.json', help='JSON results path')
+    parser.add_argument('--record', action='store_true', help='record the cassette from the live backend')
+    parser.add_argument('--update-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--repeat', type=int, default=50, help='timed runs of every message')
+    parser.add_argument('--latency-scale', type=float, default=0.0,
+                        help='replay recorded model latency scaled by this factor; 0 measures our code only')
+    parser.add_argument('--time-tolerance', type=float, default=0.25, help='allowed p50 slowdown, as a fraction')
+    parser.add_argument('--time-slack-us', type=float, default=20.0, help='allowed p50 slowdown in microseconds')
+    parser.add_argument('--memory-tolerance', type=float, default=0.10, help='allowed memory growth, as a fraction')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.record:
+        if os.path.exists(args.cassette):
+            os.remove(args.cassette)
+        record(args)
+        return
+
+    results = measure(args)
+    if args.update_baseline:
+        write_results(args.baseline, "regression", vars(args), results)
+        return
+    write_results(args.output, "regression", vars(args), results)
+
+    if not os.path.exists(args.baseline):
+        sys.exit(f"No baseline at {args.baseline}; store one with --update-baseline")
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)["results"]
+
+    regressions = compare(results, baseline, args)
+    if regressions:
+        print("Performance regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("No regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import time
+import logging
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BOT_SECONDS = REGISTRY.histogram(
+    "bot_request_seconds",
+    "Time each bot spent answering a message, excluding deferred detail",
+    ["bot"]
+)
+BOT_REQUESTS = REGISTRY.counter(
+    "bot_requests_total",
+    "Messages answered by each bot, by outcome",
+    ["bot", "status"]
+)
+
+
+class UnknownBot(KeyError):
+    """No bot is registered under the requested name"""
+
+
+class BotRegistry:
+    """Chatbots served from one process, looked up by name
+
+    Bots are adapters with a chat(message, session_id) method returning the
+    same payload as SafetyAssistant.process_message: a first "chunk", any
+    "remaining_chunks" and optionally a deferred "detail" callable. Their
+    handles_emergencies flag says whether emergency messages use the
+    separate emergency rate limit. The registry only times and counts the
+    calls; sharing the model client, cache and upstream limiter is up to
+    whoever builds the bots.
+    """
+
+    def __init__(self):
+        self._bots = {}
+
+    def register(self, name, bot):
+        if name in self._bots:
+            raise ValueError(f"A bot named {name!r} is already registered")
+        self._bots[name] = bot
+        logger.info(f"Registered bot {name}")
+
+    def get(self, name):
+        bot = self._bots.get(name)
+        if bot is None:
+            raise UnknownBot(name)
+        return bot
+
+    def names(self):
+        return sorted(self._bots)
+
+    def chat(self, name, message, session_id):
+        """Answer a message with the named bot, recording its latency and outcome"""
+        bot = self.get(name)
+        started = time.perf_counter()
+        try:
+            response = bot.chat(message, session_id)
+        except Exception:
+            BOT_REQUESTS.inc(bot=name, status="error")
+            raise
+        finally:
+            BOT_SECONDS.observe(time.perf_counter() - started, bot=name)
+        BOT_REQUESTS.inc(bot=name, status="ok")
+        return response
+
+    def stats(self):
+        return {
+            name: dict(
+                bot.stats(),
+                answered=BOT_REQUESTS.value(bot=name, status="ok"),
+                errors=BOT_REQUESTS.value(bot=name, status="error")
+            )
+            for name, bot in sorted(self._bots.items())
+        }
+
+
+class SafetyBot:
+    """Serve a SafetyAssistant through the registry, keeping state in the session manager"""
+
+    handles_emergencies = True
+
+    def __init__(self, assistant, session_manager):
+        self.assistant = assistant
+        self.session_manager = session_manager
+
+    def chat(self, message, session_id):
+        state = self.session_manager.get(session_id)
+        response = self.assistant.process_message(message, state, defer_detail=True)
+        self.session_manager.save(state)
+
+        detail = response.get('detail')
+        if detail is not None:
+            # The detailed answer joins the conversation, so save the state again after it
+            def detail_and_save():
+                chunks = detail()
+                self.session_manager.save(state)
+                return chunks
+            response['detail'] = detail_and_save
+        return response
+
+    def stats(self):
+        return {"sessions": self.session_manager.stats()["active_sessions"]}
+
+
+class TravelBot:
+    """Serve one TravelBudgetBot through the registry, keeping state in the session manager
+
+    Trip details and turns live on the session's conversation state, so every
+    worker under serve.py sees the same trip and history stays bounded by the
+    session manager. Travel sessions are stored under their own prefix so they
+    never mix with safety conversations.
+    """
+
+    handles_emergencies = False
+
+    def __init__(self, bot, session_manager, prefix="travel:"):
+        self.bot = bot
+        self.session_manager = session_manager
+        self.prefix = prefix
+
+    def chat(self, message, session_id):
+        state = self.session_manager.get(self.prefix + session_id)
+        response = self.bot.process_message(message, state)
+        self.session_manager.save(state)
+        return {"chunk": response, "has_more": False, "remaining_chunks": []}
+
+    def stats(self):
+        # Travel sessions are counted with the safety ones in the session manager
+        return {}
@@ -0,0 +1,152 @@
+import itertools
+import logging
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ("accommodation", "transportation", "food", "activities", "shopping", "miscellaneous")
+
+# Share of the spendable budget (after the emergency fund) for each category
+ALLOCATION_PROFILES = {
+    "budget": {"accommodation": 0.30, "transportation": 0.25, "food": 0.25, "activities": 0.10,
+               "shopping": 0.03, "miscellaneous": 0.07},
+    "balanced": {"accommodation": 0.35, "transportation": 0.20, "food": 0.20, "activities": 0.12,
+                 "shopping": 0.05, "miscellaneous": 0.08},
+    "comfort": {"accommodation": 0.42, "transportation": 0.18, "food": 0.18, "activities": 0.12,
+                "shopping": 0.05, "miscellaneous": 0.05}
+}
+
+# Largest comparison answered in one call
+MAX_SCENARIOS = 1000
+
+
+def is_positive_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+
+class BudgetEngine:
+    """Compute trip budget allocations and daily budgets locally, without calling the model
+
+    A plan reserves an emergency fund, splits the rest between expense
+    categories by an allocation profile and divides it per day and per
+    traveller. Amounts already committed to a category are kept, and the
+    remainder is shared between the other categories in profile proportions.
+    """
+
+    def __init__(self, profiles=None, emergency_fund=0.10):
+        self.profiles = profiles or ALLOCATION_PROFILES
+        self.emergency_fund = emergency_fund  # Share of the total held back for surprises
+        for name, shares in self.profiles.items():
+            if abs(sum(shares.values()) - 1) > 1e-6:
+                raise ValueError(f"Allocation profile {name!r} shares must add up to 1")
+
+    def allocate(self, total_budget, duration=None, travelers=None, profile="balanced", committed=None):
+        """Return the allocation for one trip as a dict of rounded amounts"""
+        return self._plan(self._shares(profile), profile, total_budget, duration, travelers, committed)
+
+    def compare(self, total_budget, durations=(None,), travelers=(None,), profiles=None, committed=None):
+        """Return a plan for every combination of duration, traveller count and profile
+
+        The category split only depends on the profile, so it is worked out
+        once per profile and each variant only divides by its days and people.
+        """
+        profiles = list(profiles or self.profiles)
+        count = len(durations) * len(travelers) * len(profiles)
+        if count > MAX_SCENARIOS:
+            raise ValueError(f"Too many scenarios ({count}); compare at most {MAX_SCENARIOS} at once")
+
+        shares = {name: self._shares(name) for name in profiles}
+        base = {name: self._plan(shares[name], name, total_budget, None, None, committed) for name in profiles}
+        scenarios = []
+        for duration, people, name in itertools.product(durations, travelers, profiles):
+            scenarios.append(self._per_day(dict(base[name]), duration, people))
+
+        daily = [s for s in scenarios if s["daily_per_person"] is not None]
+        return {
+            "scenarios": scenarios,
+            "count": len(scenarios),
+            "lowest_daily_per_person": min(daily, key=lambda s: s["daily_per_person"]) if daily else None,
+            "highest_daily_per_person": max(daily, key=lambda s: s["daily_per_person"]) if daily else None
+        }
+
+    def _shares(self, profile):
+        try:
+            return self.profiles[profile]
+        except KeyError:
+            raise ValueError(f"Unknown allocation profile {profile!r}; choose from {', '.join(self.profiles)}")
+
+    def _plan(self, shares, profile, total_budget, duration, travelers, committed):
+        if not is_positive_number(total_budget):
+            raise ValueError("Total budget must be a positive number")
+
+        emergency = total_budget * self.emergency_fund
+        spendable = total_budget - emergency
+        committed = {category: amount for category, amount in (committed or {}).items() if amount}
+        unknown = set(committed) - set(CATEGORIES)
+        if unknown:
+            raise ValueError(f"Unknown expense categories: {', '.join(sorted(unknown))}")
+        if not all(is_positive_number(amount) for amount in committed.values()):
+            raise ValueError("Committed expenses must be positive numbers")
+
+        # Committed amounts stay as they are; the rest is split by the remaining shares
+        open_share = sum(share for category, share in shares.items() if category not in committed)
+        remaining = spendable - sum(committed.values())
+        allocations = {}
+        for category in CATEGORIES:
+            if category in committed:
+                allocations[category] = committed[category]
+            elif remaining > 0 and open_share:
+                allocations[category] = remaining * shares[category] / open_share
+            else:
+                allocations[category] = 0.0
+
+        plan = {
+            "profile": profile,
+            "total_budget": round(total_budget, 2),
+            "emergency_fund": round(emergency, 2),
+            "allocations": {category: round(amount, 2) for category, amount in allocations.items()},
+            "over_budget": round(max(-remaining, 0.0), 2)
+        }
+        return self._per_day(plan, duration, travelers)
+
+    def _per_day(self, plan, duration, travelers):
+        for name, value in (("Duration", duration), ("Traveller count", travelers)):
+            if value is not None and not is_positive_number(value):
+                raise ValueError(f"{name} must be a positive number")
+        plan["duration"] = duration
+        plan["travelers"] = travelers
+        if not duration:
+            plan["daily_per_person"] = None
+            plan["daily_by_category"] = None
+            return plan
+
+        divisor = duration * (travelers or 1)
+        spendable = sum(plan["allocations"].values())
+        plan["daily_per_person"] = round(spendable / divisor, 2)
+        plan["daily_by_category"] = {
+            category: round(amount / divisor, 2) for category, amount in plan["allocations"].items()
+        }
+        return plan
+
+    def render(self, plan, currency="USD", destination=None):
+        """Format a plan as the text reply the chatbot sends"""
+        lines = [f"💰 Budget breakdown{' for ' + destination if destination else ''} "
+                 f"({plan['profile']} profile): {plan['total_budget']:,.2f} {currency}", ""]
+        for category, amount in plan["allocations"].items():
+            share = amount / plan["total_budget"] * 100
+            lines.append(f"- {category.capitalize()}: {amount:,.2f} {currency} ({share:.0f}%)")
+        lines.append(f"- Emergency fund: {plan['emergency_fund']:,.2f} {currency}")
+
+        if plan["daily_per_person"] is not None:
+            people = plan["travelers"] or 1
+            lines.append("")
+            lines.append(f"📅 Daily budget per person over {plan['duration']} days for {people} "
+                         f"traveller{'s' if people != 1 else ''}: {plan['daily_per_person']:,.2f} {currency}")
+        else:
+            lines.append("")
+            lines.append("Tell me how many days you are travelling for a daily budget per person.")
+
+        if plan["over_budget"]:
+            lines.append("")
+            lines.append(f"⚠️ Your committed expenses exceed the spendable budget by "
+                         f"{plan['over_budget']:,.2f} {currency}.")
+        return "\n".join(lines)
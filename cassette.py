@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import logging
+from llm_backend import BackendUnavailable
+
+logger = logging.getLogger(__name__)
+
+
+class CassetteMiss(BackendUnavailable):
+    """A replayed prompt has no recording in the cassette"""
+
+
+class Cassette:
+    """Recorded prompt/response pairs with their latencies, stored one JSON object per line
+
+    Recordings are appended to the file as they happen, so a recording run
+    that is interrupted keeps everything captured so far. A prompt recorded
+    several times replays its responses in the order they were recorded.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = {}  # prompt -> list of recordings
+        self._cursors = {}  # prompt -> index of the next recording to replay
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry["prompt"], []).append(entry)
+            logger.info(f"Loaded {len(self)} recorded prompts from {path}")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def record(self, prompt, response, latency, pieces=None):
+        """Add a recording; pieces is a list of (seconds after the call started, text) for streams"""
+        entry = {"prompt": prompt, "response": response, "latency": round(latency, 6)}
+        if pieces is not None:
+            entry["pieces"] = [[round(offset, 6), text] for offset, text in pieces]
+        with self._lock:
+            self._entries.setdefault(prompt, []).append(entry)
+            self.recorded += 1
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def lookup(self, prompt):
+        """Return the next recording for a prompt, repeating the last one; None if never recorded"""
+        with self._lock:
+            entries = self._entries.get(prompt)
+            if not entries:
+                return None
+            index = self._cursors.get(prompt, 0)
+            self._cursors[prompt] = index + 1
+            return entries[min(index, len(entries) - 1)]
+
+    def rewind(self):
+        """Replay every prompt from its first recording again"""
+        with self._lock:
+            self._cursors.clear()
+
+
+class RecordingBackend:
+    """Pass calls through to another backend and record each prompt, response and latency
+
+    Failed calls are not recorded; a retry that succeeds is.
+    """
+
+    name = "recording"
+
+    def __init__(self, backend, cassette):
+        self.backend = backend
+        self.cassette = cassette
+
+    @property
+    def ready(self):
+        return self.backend.ready
+
+    @property
+    def available(self):
+        return self.backend.available
+
+    @property
+    def error(self):
+        return getattr(self.backend, 'error', None)
+
+    def warm_up(self):
+        return self.backend.warm_up()
+
+    def generate(self, prompt):
+        started = time.perf_counter()
+        response = self.backend.generate(prompt)
+        self.cassette.record(prompt, response, time.perf_counter() - started)
+        return response
+
+    def stream(self, prompt):
+        started = time.perf_counter()
+        pieces = []
+        for piece in self.backend.stream(prompt):
+            pieces.append((time.perf_counter() - started, piece))
+            yield piece
+        self.cassette.record(prompt, ''.join(text for _, text in pieces), time.perf_counter() - started, pieces)
+
+    async def agenerate(self, prompt):
+        started = time.perf_counter()
+        response = await self.backend.agenerate(prompt)
+        self.cassette.record(prompt, response, time.perf_counter() - started)
+        return response
+
+
+class ReplayBackend:
+    """Serve recorded responses without network access, at the recorded latencies scaled by latency_scale
+
+    A latency_scale of 0 replays instantly, which leaves only the cost of
+    our own code. Prompts missing from the cassette raise CassetteMiss.
+    """
+
+    name = "replay"
+    ready = True
+    available = True
+    error = None
+
+    def __init__(self, cassette, latency_scale=1.0):
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.misses = 0
+
+    def warm_up(self):
+        return True
+
+    def _lookup(self, prompt):
+        entry = self.cassette.lookup(prompt)
+        with self._lock:
+            self.calls += 1
+            if entry is None:
+                self.misses += 1
+        if entry is None:
+            raise CassetteMiss(f"No recording for prompt starting {prompt.strip()[:60]!r}")
+        return entry
+
+    def generate(self, prompt):
+        entry = self._lookup(prompt)
+        if self.latency_scale:
+            time.sleep(entry["latency"] * self.latency_scale)
+        return entry["response"]
+
+    def stream(self, prompt):
+        entry = self._lookup(prompt)
+        # Recordings made with generate() replay as one piece at the end
+        pieces = entry.get("pieces") or [[entry["latency"], entry["response"]]]
+        started = time.perf_counter()
+        for offset, text in pieces:
+            if self.latency_scale:
+                time.sleep(max(offset * self.latency_scale - (time.perf_counter() - started), 0.0))
+            yield text
+
+    async def agenerate(self, prompt):
+        entry = self._lookup(prompt)
+        if self.latency_scale:
+            await asyncio.sleep(entry["latency"] * self.latency_scale)
+        return entry["response"]
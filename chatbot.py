@@ -1,102 +1,141 @@
 import os
-import google.generativeai as genai
 from datetime import datetime
 import json
-import re
 from dotenv import load_dotenv
 import logging
+from model_client import ModelClient
+from llm_backend import create_backend
+from intent_router import IntentRouter
+from session_manager import ConversationState
+from response_cache import ResponseCache
+from resilience import CircuitBreaker, RetryPolicy
+from conversation_store import ConversationStore
+from budget_engine import BudgetEngine
+from trip_extractor import TripExtractor
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
-
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-    logger.info("Successfully configured Gemini API")
-except Exception as e:
-    logger.error(f"Error configuring Gemini API: {str(e)}")
-    raise
-
 SECRET_KEY = os.getenv("SECRET_KEY")
 
+CONVERSATION_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Instance', 'conversations.db')
+DESTINATIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'destinations.txt')
+
 class TravelBudgetBot:
-    def __init__(self):
-        try:
-            # Initialize the Gemini model
-            self.model = genai.GenerativeModel('gemini-1.5-pro')
-            logger.info("Successfully initialized Gemini model")
-        except Exception as e:
-            logger.error(f"Error initializing Gemini model: {str(e)}")
-            raise
-        
+    # Keywords for each handler, highest priority first
+    intent_keywords = [
+        ("breakdown", ["budget", "breakdown"]),
+        ("savings", ["save", "savings"]),
+        ("local_tips", ["local", "tips"])
+    ]
+
+    # Seconds each handler's model call may spend upstream, retries included,
+    # before the user gets an apology instead of a stalled request
+    deadlines = {
+        "breakdown": 20.0,
+        "savings": 20.0,
+        "local_tips": 20.0,
+        "general": 20.0
+    }
+
+    def __init__(self, backend=None, cache=None, store=None, session_id="travel-cli", budget_engine=None,
+                 narrate=False, extractor=None, client=None, max_turns=20):
+        # Bots served together pass in one shared ModelClient; otherwise build one
+        # here, with Gemini as the backend unless LLM_BACKEND selects another one
+        if client is None:
+            client = ModelClient(
+                backend if backend is not None else create_backend(),
+                cache if cache is not None else ResponseCache(),
+                breaker=CircuitBreaker(),
+                retry=RetryPolicy()
+            )
+        self.client = client
+        self.backend = client.backend
+        self.router = IntentRouter(self.intent_keywords)
+        # Trip details are read from each message locally rather than asked for again
+        self.extractor = extractor or TripExtractor.from_file(DESTINATIONS_PATH)
+        # Budget numbers are computed locally; the model only adds tips when narrate is set
+        self.budget_engine = budget_engine or BudgetEngine()
+        self.narrate = narrate
         self.user_profile = {}
-        self.conversation_history = []
-        self.travel_budget_info = {
-            "total_budget": None,
-            "trip_details": {
-                "destination": None,
-                "duration": None,
-                "travel_dates": None,
-                "travelers": None
-            },
-            "expense_categories": {
-                "accommodation": 0,
-                "transportation": 0,
-                "food": 0,
-                "activities": 0,
-                "shopping": 0,
-                "miscellaneous": 0
-            },
-            "savings_goal": None,
-            "currency": "USD"
-        }
+        
+        # Conversation state used when no per-session state is passed in. Its
+        # turns are saved through the store's background writer and reloaded on start.
+        self.store = store
+        self.session_id = session_id
+        self.state = ConversationState(session_id, max_turns=max_turns, store=store)
+        if store is not None:
+            self.state.restore(store.recent_turns(session_id, max_turns))
     
-    def generate_content_safely(self, prompt):
+    def trip_info(self, state):
+        """Return the budget and trip details kept on a conversation state, creating them on first use"""
+        info = state.data.get("travel_budget_info")
+        if info is None:
+            info = state.data["travel_budget_info"] = {
+                "total_budget": None,
+                "trip_details": {
+                    "destination": None,
+                    "duration": None,
+                    "travel_dates": None,
+                    "travelers": None
+                },
+                "expense_categories": {
+                    "accommodation": 0,
+                    "transportation": 0,
+                    "food": 0,
+                    "activities": 0,
+                    "shopping": 0,
+                    "miscellaneous": 0
+                },
+                "savings_goal": None,
+                "currency": "USD"
+            }
+        return info
+    
+    def generate_content_safely(self, prompt, cache_ttl=None, deadline=None):
         """Safely generate content with error handling"""
         try:
-            logger.debug(f"Sending prompt to Gemini API: {prompt[:100]}...")
-            response = self.model.generate_content(prompt)
-            logger.debug("Successfully received response from Gemini API")
-            return response.text
+            return self.client.generate(prompt, cache_ttl, deadline)
         except Exception as e:
             logger.error(f"Error generating content: {str(e)}")
             return f"I apologize, but I encountered an error: {str(e)}. Please try again or rephrase your question."
     
-    def process_message(self, user_message):
-        """Process user messages and generate appropriate responses"""
+    def process_message(self, user_message, state=None):
+        """Process user messages and generate appropriate responses
+        
+        Trip details and turns are kept on state, so one bot can serve many
+        sessions; without one the bot's own conversation state is used.
+        """
+        if state is None:
+            state = self.state
+        
         try:
+            travel_budget_info = self.trip_info(state)
+            
             # Add message to conversation history
-            self.conversation_history.append({"role": "user", "content": user_message})
+            state.add_turn("user", user_message)
             
-            # Extract information from user message
-            if "budget" in user_message.lower():
-                budget_match = re.search(r"(\d+)\s*(?:k|thousand|k\/trip|for trip)", user_message.lower())
-                if budget_match:
-                    self.travel_budget_info["total_budget"] = int(budget_match.group(1)) * 1000
+            # Extract budget, currency, destination, duration and travellers in one pass
+            self.extractor.update(travel_budget_info, user_message)
             
             # Generate response based on message content
-            if "budget" in user_message.lower() or "breakdown" in user_message.lower():
-                response = self.generate_travel_budget_breakdown()
-            elif "save" in user_message.lower() or "savings" in user_message.lower():
-                response = self.suggest_travel_savings_strategies()
-            elif "local" in user_message.lower() or "tips" in user_message.lower():
-                response = self.provide_local_budget_tips()
+            intent, _ = self.router.route(user_message)
+            if intent == "breakdown":
+                response = self.generate_travel_budget_breakdown(travel_budget_info)
+            elif intent == "savings":
+                response = self.suggest_travel_savings_strategies(travel_budget_info)
+            elif intent == "local_tips":
+                response = self.provide_local_budget_tips(travel_budget_info)
             else:
                 # Default response for general queries
                 prompt = f"""
                 You are a helpful travel budget assistant. The user has provided the following information:
-                Destination: {self.travel_budget_info['trip_details']['destination']}
-                Total budget: {self.travel_budget_info['total_budget']} {self.travel_budget_info['currency']}
-                Duration: {self.travel_budget_info['trip_details']['duration']} days
-                Current expenses: {json.dumps(self.travel_budget_info['expense_categories'])}
+                Destination: {travel_budget_info['trip_details']['destination']}
+                Total budget: {travel_budget_info['total_budget']} {travel_budget_info['currency']}
+                Duration: {travel_budget_info['trip_details']['duration']} days
+                Current expenses: {json.dumps(travel_budget_info['expense_categories'])}
                 
                 Please provide a helpful response to: {user_message}
                 
@@ -108,60 +147,61 @@ class TravelBudgetBot:
                 5. Travel planning advice
                 """
                 
-                response = self.generate_content_safely(prompt)
+                response = self.generate_content_safely(prompt, deadline=self.deadlines["general"])
             
             # Add response to conversation history
-            self.conversation_history.append({"role": "assistant", "content": response})
+            state.add_turn("assistant", response)
             
             return response
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}")
             return f"I apologize, but I encountered an error: {str(e)}. Please try again or rephrase your question."
     
-    def generate_travel_budget_breakdown(self):
+    def generate_travel_budget_breakdown(self, travel_budget_info):
         """Generate a travel budget breakdown based on the current information"""
-        if not self.travel_budget_info["total_budget"]:
+        if not travel_budget_info["total_budget"]:
             return "Please provide your total travel budget first."
         
-        prompt = f"""
-        Create a detailed travel budget breakdown for a trip to {self.travel_budget_info['trip_details']['destination']} 
-        with a total budget of {self.travel_budget_info['total_budget']} {self.travel_budget_info['currency']}.
-        
-        Trip duration: {self.travel_budget_info['trip_details']['duration']} days
-        Number of travelers: {self.travel_budget_info['trip_details']['travelers']}
+        trip_details = travel_budget_info['trip_details']
+        try:
+            plan = self.budget_engine.allocate(
+                travel_budget_info['total_budget'],
+                trip_details['duration'],
+                trip_details['travelers'],
+                committed=travel_budget_info['expense_categories']
+            )
+        except ValueError as e:
+            return f"I couldn't work out that budget: {str(e)}"
         
-        Current expenses:
-        {json.dumps(self.travel_budget_info['expense_categories'], indent=2)}
+        breakdown = self.budget_engine.render(plan, travel_budget_info['currency'], trip_details['destination'])
+        if not self.narrate:
+            return breakdown
         
-        Provide a breakdown of:
-        1. Recommended allocation for each expense category
-        2. Daily budget per person
-        3. Tips for saving money in each category
-        4. Must-have experiences within budget
-        5. Emergency fund recommendation
-        6. Currency exchange tips
+        prompt = f"""
+        A traveller has this budget plan for a trip to {trip_details['destination']}:
+        {json.dumps(plan, indent=2)}
         
-        Include specific recommendations for:
-        - Finding affordable accommodation
-        - Transportation options
-        - Local food experiences
-        - Free or low-cost activities
-        - Shopping budget
+        Without changing any of the numbers, add short advice on:
+        1. Tips for saving money in each category
+        2. Must-have experiences within budget
+        3. Finding affordable accommodation and transportation
+        4. Local food experiences and free or low-cost activities
+        5. Currency exchange tips
         """
         
-        return self.generate_content_safely(prompt)
+        return breakdown + "\n\n" + self.generate_content_safely(prompt, deadline=self.deadlines["breakdown"])
     
-    def suggest_travel_savings_strategies(self):
+    def suggest_travel_savings_strategies(self, travel_budget_info):
         """Suggest travel savings strategies"""
         prompt = f"""
         Suggest travel savings strategies based on:
-        Destination: {self.travel_budget_info['trip_details']['destination']}
-        Total budget: {self.travel_budget_info['total_budget']} {self.travel_budget_info['currency']}
-        Duration: {self.travel_budget_info['trip_details']['duration']} days
+        Destination: {travel_budget_info['trip_details']['destination']}
+        Total budget: {travel_budget_info['total_budget']} {travel_budget_info['currency']}
+        Duration: {travel_budget_info['trip_details']['duration']} days
         
         Include:
         1. Best time to book flights and accommodation
-        2. Money-saving travel hacks for {self.travel_budget_info['trip_details']['destination']}
+        2. Money-saving travel hacks for {travel_budget_info['trip_details']['destination']}
         3. Local transportation tips
         4. Free activities and attractions
         5. Budget-friendly dining options
@@ -169,15 +209,15 @@ class TravelBudgetBot:
         7. Travel insurance considerations
         """
         
-        return self.generate_content_safely(prompt)
+        return self.generate_content_safely(prompt, deadline=self.deadlines["savings"])
     
-    def provide_local_budget_tips(self):
+    def provide_local_budget_tips(self, travel_budget_info):
         """Provide destination-specific budget tips"""
-        if not self.travel_budget_info["trip_details"]["destination"]:
+        if not travel_budget_info["trip_details"]["destination"]:
             return "Please specify your travel destination first."
         
         prompt = f"""
-        Provide budget tips specific to {self.travel_budget_info['trip_details']['destination']}:
+        Provide budget tips specific to {travel_budget_info['trip_details']['destination']}:
         
         Include:
         1. Local cost of living
@@ -190,19 +230,24 @@ class TravelBudgetBot:
         8. Best value local food options
         """
         
-        return self.generate_content_safely(prompt)
+        return self.generate_content_safely(prompt, deadline=self.deadlines["local_tips"])
 
 def main():
-    bot = TravelBudgetBot()
+    logging.basicConfig(level=logging.INFO)
+    store = ConversationStore(os.getenv("CONVERSATION_DB", CONVERSATION_DB_PATH))
+    bot = TravelBudgetBot(store=store, narrate=os.getenv("BUDGET_NARRATIVE", "0") == "1")
     print("Travel Budget Assistant initialized. Type 'quit' to exit.")
     
-    while True:
-        user_input = input("You: ")
-        if user_input.lower() == 'quit':
-            break
-        
-        response = bot.process_message(user_input)
-        print("Assistant:", response)
+    try:
+        while True:
+            user_input = input("You: ")
+            if user_input.lower() == 'quit':
+                break
+            
+            response = bot.process_message(user_input)
+            print("Assistant:", response)
+    finally:
+        store.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
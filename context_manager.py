@@ -0,0 +1,167 @@
+import math
+import re
+import threading
+import logging
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Token counts per prompt are small integers, so bucket them by powers of two
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+PROMPT_TOKENS = REGISTRY.histogram(
+    "chat_prompt_tokens",
+    "Estimated tokens in each prompt sent to the model, by handler",
+    ["handler"],
+    buckets=TOKEN_BUCKETS
+)
+CONTEXT_TOKENS = REGISTRY.histogram(
+    "chat_context_tokens",
+    "Estimated tokens of conversation context included in each prompt",
+    buckets=TOKEN_BUCKETS
+)
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s|\n")
+
+SUMMARY_HEADER = "Summary of earlier conversation:\n"
+RECENT_HEADER = "Recent conversation:\n"
+
+
+def estimate_tokens(text):
+    """Rough token count for budgeting, about four characters per token"""
+    return math.ceil(len(text) / 4)
+
+
+def truncate_tokens(text, tokens):
+    """Cut text to roughly the given number of tokens"""
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    return text[:max(limit - 3, 0)].rstrip() + "..."
+
+
+def turn_line(role, text):
+    return f"{'User' if role == 'user' else 'Assistant'}: {text}"
+
+
+def first_sentence(text):
+    """The first sentence or line of a turn, used as its summary"""
+    text = text.strip()
+    match = SENTENCE_END.search(text)
+    return text[:match.start()] if match else text
+
+
+class ContextManager:
+    """Assemble conversation context for prompts within a token budget
+
+    Recent turns are included newest first until the budget is spent. Older
+    turns are folded into a compact summary kept on the conversation state,
+    refreshed once summarize_every turns have aged out of the window, so
+    the prompt stays about the same size however long the conversation runs.
+    """
+
+    def __init__(self, budget_tokens=600, max_turn_tokens=150, summary_tokens=120, summarize_every=4,
+                 summarizer=None):
+        self.budget_tokens = budget_tokens
+        self.max_turn_tokens = max_turn_tokens  # Long answers are cut so one turn cannot use the budget
+        self.summary_tokens = summary_tokens
+        self.summarize_every = summarize_every
+        # Callable turning a list of (role, content) into summary lines; extractive by default
+        self.summarizer = summarizer or self.summarize_turns
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.summaries = 0
+        self.total_prompt_tokens = 0
+        self.max_prompt_tokens = 0
+
+    def summarize_turns(self, turns):
+        """Summarize turns as one short line each, keeping what the user asked"""
+        lines = []
+        for role, content in turns:
+            label = "User asked" if role == "user" else "Assistant covered"
+            lines.append(f"{label}: {truncate_tokens(first_sentence(content), 25)}")
+        return lines
+
+    def build(self, state, user_message=None):
+        """Return the context text for the next prompt from a conversation state"""
+        turns = list(state.history)
+        # The message being answered goes into the prompt separately
+        if turns and turns[-1].role == "user" and turns[-1].content == user_message:
+            turns.pop()
+
+        # Headers and line breaks are charged too, so the whole context fits the budget
+        remaining = self.budget_tokens - self.summary_cost(state.summary) - estimate_tokens(RECENT_HEADER)
+        recent = []
+        for turn in reversed(turns):
+            text = truncate_tokens(turn.content, self.max_turn_tokens)
+            cost = estimate_tokens(turn_line(turn.role, text)) + 1
+            if cost > remaining:
+                break
+            recent.append((turn.role, text))
+            remaining -= cost
+        recent.reverse()
+
+        # Turns that aged out of the window but are not yet in the summary
+        window_start = len(turns) - len(recent)
+        unsummarized = [turn for turn in turns[:window_start] if turn.timestamp > state.summarized_until]
+        if len(unsummarized) >= self.summarize_every:
+            previous_cost = self.summary_cost(state.summary)
+            self.refresh_summary(state, unsummarized)
+            # A longer summary pushes the oldest recent turns out; they are summarized later
+            remaining += previous_cost - self.summary_cost(state.summary)
+            while remaining < 0 and recent:
+                remaining += estimate_tokens(turn_line(*recent.pop(0))) + 1
+
+        lines = []
+        if state.summary:
+            lines.append(SUMMARY_HEADER + state.summary)
+        if recent:
+            lines.append(RECENT_HEADER + "\n".join(turn_line(role, text) for role, text in recent))
+        context = "\n\n".join(lines)
+        CONTEXT_TOKENS.observe(estimate_tokens(context))
+        return context
+
+    def summary_cost(self, summary):
+        """Tokens the summary section takes in the context, with its header and separator"""
+        return estimate_tokens(SUMMARY_HEADER + summary) + 1 if summary else 0
+
+    def refresh_summary(self, state, turns):
+        """Fold turns into the state's summary, keeping the newest points within the summary budget"""
+        lines = (state.summary.split("\n") if state.summary else []) + self.summarizer(
+            [(turn.role, turn.content) for turn in turns]
+        )
+        kept = []
+        used = 0
+        for line in reversed(lines):
+            used += estimate_tokens(line) + 1
+            if used > self.summary_tokens:
+                break
+            kept.append(line)
+        kept.reverse()
+
+        state.summary = "\n".join(kept)
+        state.summarized_until = turns[-1].timestamp
+        with self._lock:
+            self.summaries += 1
+
+    def record_prompt(self, handler, prompt):
+        """Report the size of a prompt sent to the model"""
+        tokens = estimate_tokens(prompt)
+        PROMPT_TOKENS.observe(tokens, handler=handler)
+        with self._lock:
+            self.requests += 1
+            self.total_prompt_tokens += tokens
+            self.max_prompt_tokens = max(self.max_prompt_tokens, tokens)
+        return tokens
+
+    def stats(self):
+        """Return prompt size and summary counters"""
+        with self._lock:
+            return {
+                "prompts": self.requests,
+                "mean_prompt_tokens": round(self.total_prompt_tokens / self.requests, 1) if self.requests else 0.0,
+                "max_prompt_tokens": self.max_prompt_tokens,
+                "summaries": self.summaries,
+                "budget_tokens": self.budget_tokens
+            }
@@ -0,0 +1,164 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ConversationStore:
+    """Persist conversation turns to SQLite from a background thread that batches inserts
+
+    append() only puts the turn on an in-memory queue, so saving a turn adds
+    no disk I/O to the request. The writer thread commits queued turns in
+    batches; if the queue fills up, new turns are dropped rather than
+    blocking requests.
+
+    The writer thread and read connection are started on first use in each
+    process, so a store created before the server forks works in every worker.
+    """
+
+    def __init__(self, db_path, batch_size=200, flush_interval=0.25, max_pending=10000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval  # Longest a turn waits before it is committed
+        self.max_pending = max_pending
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        db = self._connect()
+        db.executescript(
+            "CREATE TABLE IF NOT EXISTS conversation_turns ("
+            "id INTEGER PRIMARY KEY, session_id TEXT NOT NULL, role TEXT NOT NULL, "
+            "content TEXT NOT NULL, created_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_conversation_turns_session "
+            "ON conversation_turns (session_id, created_at);"
+        )
+        db.close()
+
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._read_db = None
+        self._read_lock = None
+        self._queue = None
+        self._writer = None
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        logger.info(f"Conversation turns persisted to {db_path}")
+
+    def _ensure_started(self):
+        """Open the read connection and start the writer thread for this process"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._read_db = self._connect()
+            self._read_lock = threading.Lock()
+            self._queue = queue.Queue(maxsize=self.max_pending)
+            self._writer = threading.Thread(target=self._run, name="conversation-writer", daemon=True)
+            self._writer.start()
+            self._pid = os.getpid()
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, check_same_thread=False)
+        # WAL lets lookups read while the writer commits; NORMAL sync is safe with WAL
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def append(self, session_id, role, content, created_at=None):
+        """Queue a turn for writing without waiting for the database"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((session_id, role, content, created_at if created_at is not None else time.time()))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Conversation write queue is full, {self.dropped} turns dropped so far")
+
+    def recent_turns(self, session_id, limit=20):
+        """Return up to limit (role, content, created_at) tuples for a session, oldest first"""
+        self._ensure_started()
+        try:
+            with self._read_lock:
+                rows = self._read_db.execute(
+                    "SELECT role, content, created_at FROM conversation_turns "
+                    "WHERE session_id = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (session_id, limit)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading conversation store: {str(e)}")
+            return []
+        rows.reverse()
+        return rows
+
+    def _run(self):
+        db = self._connect()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            # Gather whatever else arrives shortly after, up to a full batch
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    self._queue.task_done()
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write(db, batch)
+                for _ in batch:
+                    self._queue.task_done()
+        db.close()
+
+    def _write(self, db, batch):
+        try:
+            with db:
+                db.executemany(
+                    "INSERT INTO conversation_turns (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                    batch
+                )
+            self.written += len(batch)
+            self.batches += 1
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Error writing {len(batch)} conversation turns: {str(e)}")
+
+    def flush(self):
+        """Block until every queued turn has been written"""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def close(self):
+        """Write the remaining turns and stop the writer thread"""
+        if self._pid != os.getpid():
+            return
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        with self._read_lock:
+            self._read_db.close()
+
+    def stats(self):
+        """Return write, batch and queue counters"""
+        return {
+            "pending": self._queue.qsize() if self._pid == os.getpid() else 0,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "errors": self.errors
+        }
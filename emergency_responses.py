@@ -0,0 +1,54 @@
+import json
+import logging
+from intent_router import IntentRouter
+
+logger = logging.getLogger(__name__)
+
+
+class EmergencyResponder:
+    """Render immediate emergency guidance from a local table without calling the model
+
+    Every situation's reply is rendered once up front, so answering a
+    message costs one keyword match and a dictionary lookup.
+    """
+
+    def __init__(self, numbers, situations, default):
+        self.numbers = {entry["name"]: entry["number"] for entry in numbers}
+        contacts = " | ".join(f"{entry['name']}: {entry['number']}" for entry in numbers)
+
+        # Earlier situations win when a message matches several
+        self.router = IntentRouter([(situation["name"], situation["keywords"]) for situation in situations])
+        self._responses = {
+            situation["name"]: self.render(situation, contacts)
+            for situation in situations + [default]
+        }
+        self.default = default["name"]
+        logger.info(f"Prepared emergency responses for {len(situations)} situations")
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a JSON table of {numbers, situations, default}"""
+        with open(path, encoding='utf-8') as f:
+            table = json.load(f)
+        return cls(table["numbers"], table["situations"], table["default"])
+
+    def render(self, situation, contacts):
+        """Format one situation's numbers and immediate actions"""
+        if situation["call"] == "Emergency":
+            response = f"🚨 {situation['title']}: call {self.numbers['Emergency']} now.\n\n"
+        else:
+            response = (f"🚨 {situation['title']}: call {situation['call']} on {self.numbers[situation['call']]} now "
+                        f"(or {self.numbers['Emergency']} for any emergency).\n\n")
+        response += "Do this right away:\n"
+        for number, action in enumerate(situation["actions"], 1):
+            response += f"{number}. {action}\n"
+        response += f"\n📞 {contacts}"
+        return response
+
+    def situation(self, message):
+        """Return the name of the situation a message describes"""
+        return self.router.route(message)[0] or self.default
+
+    def respond(self, message):
+        """Return the precomputed immediate guidance for a message"""
+        return self._responses[self.situation(message)]
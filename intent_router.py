@@ -0,0 +1,86 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def build_trie_pattern(words):
+    """Compile a list of words into a regex alternation shaped like a prefix trie
+
+    Sharing prefixes keeps matching cost tied to the message length rather than
+    the number of keywords, and the greedy branches prefer the longest keyword.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def render(node):
+        end = '' in node
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not end:
+            return branches[0]
+        pattern = '(?:' + '|'.join(branches) + ')'
+        return pattern + '?' if end else pattern
+
+    return render(trie)
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+class IntentRouter:
+    """Find a message's intent and category in a single pass over the text"""
+
+    def __init__(self, intents, categories=None):
+        # intents is an ordered list of (intent, keywords); earlier intents take priority
+        self.intents = [intent for intent, _ in intents]
+        self.categories = list(categories or [])
+        terms = {}
+
+        for priority, (intent, keywords) in enumerate(intents):
+            for keyword in keywords:
+                terms.setdefault(keyword.lower(), []).append(("intent", priority))
+        for order, category in enumerate(self.categories):
+            terms.setdefault(category.lower(), []).append(("category", order))
+
+        # Only the longest term starting at a position is matched, so each term
+        # also carries the tags of shorter terms it begins with ("health & hygiene"
+        # still counts as "health")
+        self._terms = {}
+        for term in terms:
+            tags = []
+            for end in range(1, len(term) + 1):
+                prefix = term[:end]
+                if prefix in terms and (end == len(term) or not _is_word_char(term[end])):
+                    tags.extend(terms[prefix])
+            self._terms[term] = tags
+
+        # The lookahead lets overlapping terms match, e.g. "fire safety tips"
+        self._pattern = re.compile(
+            r'(?<!\w)(?=(' + build_trie_pattern(self._terms) + r')(?!\w))',
+            re.IGNORECASE
+        )
+        logger.debug(f"Compiled intent router with {len(self._terms)} terms")
+
+    def route(self, message):
+        """Return (intent, category) for a message; either may be None"""
+        best_intent = None
+        best_category = None
+
+        for match in self._pattern.finditer(message):
+            for kind, rank in self._terms[match.group(1).lower()]:
+                if kind == "intent":
+                    if best_intent is None or rank < best_intent:
+                        best_intent = rank
+                elif best_category is None or rank < best_category:
+                    best_category = rank
+
+        intent = self.intents[best_intent] if best_intent is not None else None
+        category = self.categories[best_category] if best_category is not None else None
+        return intent, category
@@ -0,0 +1,241 @@
+import asyncio
+import math
+import os
+import random
+import threading
+import time
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BackendUnavailable(Exception):
+    """The upstream model cannot be used, for example because it is not configured"""
+
+
+class GeminiBackend:
+    """Text generation backed by the Gemini API
+
+    The client library is imported and configured on first use, or by
+    warm_up() in the background, so constructing the backend is instant.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key=None, model_name='gemini-1.5-pro'):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.error = None  # Why the model could not be configured, once known
+
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        """Whether the client is configured and requests will not pay start-up cost"""
+        return self._model is not None
+
+    @property
+    def available(self):
+        """False once configuring the client has failed"""
+        return self.error is None
+
+    def _get_model(self):
+        if self._model is not None:
+            return self._model
+
+        with self._lock:
+            if self._model is None:
+                if self.error is not None:
+                    raise BackendUnavailable(self.error)
+                try:
+                    import google.generativeai as genai
+
+                    api_key = self.api_key or os.getenv("GEMINI_API_KEY")
+                    if not api_key:
+                        raise ValueError("GEMINI_API_KEY not found in environment variables")
+                    genai.configure(api_key=api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+                    logger.info("Successfully initialized Gemini model")
+                except Exception as e:
+                    logger.error(f"Error initializing Gemini model: {str(e)}")
+                    self.error = str(e)
+                    raise BackendUnavailable(self.error) from e
+        return self._model
+
+    def warm_up(self):
+        """Configure the client ahead of the first request; returns whether it succeeded"""
+        try:
+            self._get_model()
+            return True
+        except BackendUnavailable:
+            return False
+
+    def generate(self, prompt):
+        """Return the full response text for a prompt"""
+        return self._get_model().generate_content(prompt).text
+
+    def stream(self, prompt):
+        """Yield the response text piece by piece as it is generated"""
+        for chunk in self._get_model().generate_content(prompt, stream=True):
+            yield chunk.text
+
+    async def agenerate(self, prompt):
+        """Await the full response text for a prompt"""
+        response = await self._get_model().generate_content_async(prompt)
+        return response.text
+
+
+class OfflineBackend:
+    """Backend used when no model can be configured; every call fails fast"""
+
+    name = "offline"
+    ready = False
+    available = False
+
+    def __init__(self, error="No LLM backend is configured"):
+        self.error = error
+
+    def warm_up(self):
+        return False
+
+    def generate(self, prompt):
+        raise BackendUnavailable(self.error)
+
+    def stream(self, prompt):
+        raise BackendUnavailable(self.error)
+
+    async def agenerate(self, prompt):
+        raise BackendUnavailable(self.error)
+
+
+class StubBackendError(Exception):
+    """Simulated upstream failure raised by StubBackend"""
+
+
+class StubBackend:
+    """Offline stand-in for the model with configurable latency, streaming and error rate"""
+
+    name = "stub"
+    ready = True
+    available = True
+
+    def __init__(self, latency_mean=1.0, latency_stddev=0.3, distribution="lognormal",
+                 first_token_latency=0.2, stream_pieces=8, error_rate=0.0, response_lines=6, seed=None):
+        self.latency_mean = latency_mean
+        self.latency_stddev = latency_stddev
+        self.distribution = distribution  # "fixed", "uniform", "normal" or "lognormal"
+        self.first_token_latency = first_token_latency
+        self.stream_pieces = stream_pieces
+        self.error_rate = error_rate
+        self.response_lines = response_lines
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def warm_up(self):
+        return True
+
+    def sample_latency(self):
+        """Draw one total response latency in seconds"""
+        with self._lock:
+            self.calls += 1
+            mean, stddev = self.latency_mean, self.latency_stddev
+            if self.distribution == "fixed" or mean <= 0:
+                return max(mean, 0.0)
+            if self.distribution == "uniform":
+                return self._random.uniform(max(mean - stddev, 0.0), mean + stddev)
+            if self.distribution == "normal":
+                return max(self._random.gauss(mean, stddev), 0.0)
+
+            # Log-normal with the requested mean and standard deviation gives a realistic long tail
+            sigma_squared = math.log(1 + (stddev / mean) ** 2)
+            mu = math.log(mean) - sigma_squared / 2
+            return self._random.lognormvariate(mu, math.sqrt(sigma_squared))
+
+    def _should_fail(self):
+        with self._lock:
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def render(self, prompt):
+        """Build a deterministic, bullet-formatted reply for a prompt"""
+        reference = zlib.crc32(prompt.encode('utf-8'))
+        lines = [f"🛡️ Here is some guidance on your question (ref {reference:08x})."]
+        for number in range(1, self.response_lines + 1):
+            lines.append(f"- Subpoint {number}: ✅ Practical safety step {number}, described in a sentence or two.")
+        return '\n'.join(lines)
+
+    def generate(self, prompt):
+        """Return the full response text after a simulated delay"""
+        time.sleep(self.sample_latency())
+        if self._should_fail():
+            raise StubBackendError("Simulated upstream error")
+        return self.render(prompt)
+
+    def stream(self, prompt):
+        """Yield the response in pieces, spreading the simulated latency across them"""
+        latency = self.sample_latency()
+        time.sleep(min(self.first_token_latency, latency))
+        if self._should_fail():
+            raise StubBackendError("Simulated upstream error")
+
+        text = self.render(prompt)
+        size = max(1, -(-len(text) // self.stream_pieces))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        delay = max(latency - self.first_token_latency, 0.0) / max(len(pieces) - 1, 1)
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(delay)
+            yield piece
+
+    async def agenerate(self, prompt):
+        """Await the full response text after a simulated delay"""
+        await asyncio.sleep(self.sample_latency())
+        if self._should_fail():
+            raise StubBackendError("Simulated upstream error")
+        return self.render(prompt)
+
+
+def create_backend(name=None):
+    """Build the backend named by LLM_BACKEND ("gemini" by default, "stub" or "replay")
+
+    Set LLM_RECORD_CASSETTE to a file to record every response the backend
+    returns; LLM_BACKEND=replay serves them back from LLM_CASSETTE.
+    """
+    record_path = os.getenv("LLM_RECORD_CASSETTE")
+    backend = _create_backend(name)
+    if record_path:
+        from cassette import Cassette, RecordingBackend
+
+        logger.info(f"Recording LLM responses to {record_path}")
+        return RecordingBackend(backend, Cassette(record_path))
+    return backend
+
+
+def _create_backend(name=None):
+    name = (name or os.getenv("LLM_BACKEND", "gemini")).lower()
+    if name == "replay":
+        from cassette import Cassette, ReplayBackend
+
+        path = os.getenv("LLM_CASSETTE")
+        if not path or not os.path.exists(path):
+            raise ValueError(f"LLM_BACKEND=replay needs LLM_CASSETTE to name a recorded cassette, got {path!r}")
+        logger.info(f"Replaying LLM responses from {path}")
+        return ReplayBackend(Cassette(path), latency_scale=float(os.getenv("REPLAY_LATENCY_SCALE", "1.0")))
+    if name == "stub":
+        seed = os.getenv("STUB_SEED")
+        backend = StubBackend(
+            latency_mean=float(os.getenv("STUB_LATENCY_MEAN", "1.0")),
+            latency_stddev=float(os.getenv("STUB_LATENCY_STDDEV", "0.3")),
+            distribution=os.getenv("STUB_LATENCY_DISTRIBUTION", "lognormal"),
+            first_token_latency=float(os.getenv("STUB_FIRST_TOKEN_LATENCY", "0.2")),
+            error_rate=float(os.getenv("STUB_ERROR_RATE", "0")),
+            seed=int(seed) if seed else None
+        )
+        logger.info("Using offline stub LLM backend")
+        return backend
+    if name == "gemini":
+        return GeminiBackend()
+    raise ValueError(f"Unknown LLM backend: {name}")
@@ -0,0 +1,411 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+import logging
+from response_cache import prompt_key
+from single_flight import SingleFlight
+from metrics import REGISTRY
+from resilience import DeadlineExceeded, is_timeout, is_transient
+from admission import NORMAL, AdmissionController
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "llm_upstream_seconds",
+    "Latency of upstream model calls",
+    ["backend", "outcome"]
+)
+UPSTREAM_ERRORS = REGISTRY.counter(
+    "llm_upstream_errors_total",
+    "Failed upstream model calls, split into timeouts and other errors",
+    ["backend", "kind"]
+)
+UPSTREAM_RETRIES = REGISTRY.counter(
+    "llm_upstream_retries_total",
+    "Upstream model calls retried after a transient failure",
+    ["backend"]
+)
+UPSTREAM_HEDGES = REGISTRY.counter(
+    "llm_upstream_hedged_total",
+    "Second requests sent because the first passed the hedging latency percentile",
+    ["backend"]
+)
+
+
+class ModelClient:
+    """Front a model backend with a response cache, request coalescing and prioritized admission"""
+
+    def __init__(self, backend, cache=None, coalesce_window=0.0, max_concurrency=32,
+                 breaker=None, retry=None, hedge=None, admission=None):
+        self.backend = backend
+        self.cache = cache
+
+        # Optional CircuitBreaker, RetryPolicy and HedgePolicy from resilience.py
+        self.breaker = breaker
+        self.retry = retry
+        self.hedge = hedge
+        self.retries = 0
+        self.hedged = 0
+        # Calls given up on at their deadline, or hedges that lost, still running upstream
+        self.abandoned_running = 0
+        self._lock = threading.Lock()
+
+        # Identical prompts already in flight are answered by a single upstream call
+        self.single_flight = SingleFlight(window=coalesce_window)
+
+        # Bounds outstanding upstream calls from both paths, emergencies first
+        self.admission = admission if admission is not None else AdmissionController(max_concurrent=max_concurrency)
+        self.max_concurrency = self.admission.max_concurrent
+
+    def generate(self, prompt, cache_ttl=None, deadline=None, priority=NORMAL):
+        """Return the model's response text, serving it from the cache when possible
+
+        A cache_ttl of 0 bypasses the cache; None uses the cache's default TTL.
+        deadline bounds the seconds spent upstream, including retries, and
+        priority orders the request in the admission queue.
+        """
+        use_cache = self.cache is not None and cache_ttl != 0
+        if use_cache:
+            cached = self.cache.get(prompt)
+            if cached is not None:
+                logger.debug("Serving response from cache")
+                return cached
+
+        return self.single_flight.do(
+            prompt_key(prompt),
+            lambda: self._generate_uncached(prompt, cache_ttl if use_cache else 0, deadline, priority)
+        )
+
+    def _generate_uncached(self, prompt, cache_ttl, deadline=None, priority=NORMAL):
+        """Call the model once admitted, retrying transient failures, and cache the response"""
+        with self.admission.slot(priority):
+            text = self._generate_with_retries(prompt, deadline)
+
+        if self.cache is not None and cache_ttl != 0:
+            self.cache.set(prompt, text, cache_ttl)
+        return text
+
+    def _generate_with_retries(self, prompt, deadline):
+        # The deadline covers time upstream, not time spent waiting for a slot
+        expires_at = None if deadline is None else time.monotonic() + deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.breaker is not None:
+                self.breaker.before_call()
+
+            logger.debug(f"Sending prompt to {self.backend.name} backend: {prompt[:100]}...")
+            started = time.perf_counter()
+            try:
+                text = self._call_upstream(prompt, expires_at, deadline)
+                break
+            except Exception as e:
+                self.record_failure(started, e)
+                delay = self.retry_delay(attempt, e, expires_at)
+                if delay is None:
+                    raise
+            logger.warning(f"Retrying upstream call in {delay:.2f}s after attempt {attempt} failed")
+            time.sleep(delay)
+
+        self.record_success(started)
+        logger.debug(f"Successfully received response from {self.backend.name} backend")
+        return text
+
+    def _call_upstream(self, prompt, expires_at, deadline):
+        """Make one upstream call, hedged and bounded by the deadline when configured"""
+        hedge_delay = self.hedge.delay() if self.hedge is not None else None
+        if expires_at is None and hedge_delay is None:
+            return self.backend.generate(prompt)
+
+        pending = {self._start(self.backend.generate, prompt)}
+        try:
+            if hedge_delay is not None and (expires_at is None or time.monotonic() + hedge_delay < expires_at):
+                if not wait(pending, timeout=hedge_delay)[0]:
+                    self.count_hedge()
+                    pending.add(self._start(self.backend.generate, prompt))
+
+            error = None
+            while pending:
+                remaining = None if expires_at is None else max(expires_at - time.monotonic(), 0)
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded(f"Upstream call exceeded its {deadline}s deadline")
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            for future in pending:
+                self._abandon(future)
+
+    def _start(self, function, *args):
+        """Run a blocking upstream call on its own thread and return its future
+
+        Threads cannot be cancelled, so a call abandoned at its deadline runs
+        on until the upstream answers. A fixed-size pool would queue new calls
+        behind those abandoned ones and time them out even after the upstream
+        recovers; admission control already bounds the calls we are waiting on.
+        """
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(function(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        future.set_running_or_notify_cancel()
+        threading.Thread(target=run, name="upstream", daemon=True).start()
+        return future
+
+    def _abandon(self, future):
+        """Stop waiting for an upstream call, counting it until its thread finishes"""
+        with self._lock:
+            self.abandoned_running += 1
+        future.add_done_callback(self._abandoned_done)
+
+    def _abandoned_done(self, future):
+        with self._lock:
+            self.abandoned_running -= 1
+
+    async def agenerate(self, prompt, cache_ttl=None, deadline=None, priority=NORMAL):
+        """Await the model's response text without blocking the event loop"""
+        use_cache = self.cache is not None and cache_ttl != 0
+        if use_cache:
+            cached = await self._acache(self.cache.get, prompt)
+            if cached is not None:
+                logger.debug("Serving response from cache")
+                return cached
+
+        return await self.single_flight.ado(
+            prompt_key(prompt),
+            lambda: self._agenerate_uncached(prompt, cache_ttl if use_cache else 0, deadline, priority)
+        )
+
+    async def _agenerate_uncached(self, prompt, cache_ttl, deadline=None, priority=NORMAL):
+        """Call the model once a slot is free, retrying transient failures, and cache the response"""
+        async with self.admission.aslot(priority):
+            expires_at = None if deadline is None else time.monotonic() + deadline
+            attempt = 0
+            while True:
+                attempt += 1
+                if self.breaker is not None:
+                    self.breaker.before_call()
+
+                logger.debug(f"Sending prompt to {self.backend.name} backend: {prompt[:100]}...")
+                started = time.perf_counter()
+                try:
+                    text = await self._acall_upstream(prompt, expires_at, deadline)
+                    break
+                except Exception as e:
+                    self.record_failure(started, e)
+                    delay = self.retry_delay(attempt, e, expires_at)
+                    if delay is None:
+                        raise
+                except BaseException:
+                    self.release_probe()
+                    raise
+                logger.warning(f"Retrying upstream call in {delay:.2f}s after attempt {attempt} failed")
+                await asyncio.sleep(delay)
+
+            self.record_success(started)
+            logger.debug(f"Successfully received response from {self.backend.name} backend")
+
+        if self.cache is not None and cache_ttl != 0:
+            await self._acache(self.cache.set, prompt, text, cache_ttl)
+        return text
+
+    async def _acache(self, method, *args):
+        """Call a cache method, off the event loop when it may wait on the SQLite tier"""
+        if self.cache.on_disk:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def _acall_upstream(self, prompt, expires_at, deadline):
+        """Await one upstream call, hedged and bounded by the deadline when configured"""
+        hedge_delay = self.hedge.delay() if self.hedge is not None else None
+        if expires_at is None and hedge_delay is None:
+            return await self.backend.agenerate(prompt)
+
+        pending = {asyncio.ensure_future(self.backend.agenerate(prompt))}
+        try:
+            if hedge_delay is not None and (expires_at is None or time.monotonic() + hedge_delay < expires_at):
+                if not (await asyncio.wait(pending, timeout=hedge_delay))[0]:
+                    self.count_hedge()
+                    pending.add(asyncio.ensure_future(self.backend.agenerate(prompt)))
+
+            error = None
+            while pending:
+                remaining = None if expires_at is None else max(expires_at - time.monotonic(), 0)
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded(f"Upstream call exceeded its {deadline}s deadline")
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Unlike threads, the losing or late request can be cancelled
+            for task in pending:
+                task.cancel()
+
+    def stream(self, prompt, cache_ttl=None, priority=NORMAL, deadline=None, idle_timeout=None):
+        """Yield the model's response text piece by piece, caching the full text once complete
+
+        deadline bounds the seconds until the first piece arrives and
+        idle_timeout the seconds between later pieces; when either runs out
+        the stream raises DeadlineExceeded.
+        """
+        use_cache = self.cache is not None and cache_ttl != 0
+        if use_cache:
+            cached = self.cache.get(prompt)
+            if cached is not None:
+                logger.debug("Serving streamed response from cache")
+                yield cached
+                return
+
+        # Pieces reach the client as they arrive, so streams are not retried or hedged
+        with self.admission.slot(priority):
+            if self.breaker is not None:
+                self.breaker.before_call()
+
+            logger.debug(f"Streaming prompt to {self.backend.name} backend: {prompt[:100]}...")
+            parts = []
+            started = time.perf_counter()
+            try:
+                for piece in self._stream_upstream(prompt, deadline, idle_timeout):
+                    parts.append(piece)
+                    yield piece
+            except Exception as e:
+                self.record_failure(started, e)
+                raise
+            except BaseException:
+                # GeneratorExit when the client disconnects mid-stream
+                self.release_probe()
+                raise
+            self.record_success(started)
+        logger.debug(f"Finished streaming response from {self.backend.name} backend")
+
+        if use_cache:
+            self.cache.set(prompt, ''.join(parts), cache_ttl)
+
+    def _stream_upstream(self, prompt, deadline, idle_timeout):
+        """Yield the backend's pieces, giving up on a stream that stalls"""
+        if deadline is None and idle_timeout is None:
+            yield from self.backend.stream(prompt)
+            return
+
+        # The backend blocks while it waits for a piece, so it is read on
+        # another thread and the pieces are handed over with a timeout
+        pieces = queue.Queue()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for piece in self.backend.stream(prompt):
+                    if stop.is_set():
+                        return
+                    pieces.put(("piece", piece))
+            except Exception as e:
+                pieces.put(("error", e))
+                return
+            pieces.put(("end", None))
+
+        producer = self._start(produce)
+        first = True
+        try:
+            while True:
+                try:
+                    kind, value = pieces.get(timeout=deadline if first else idle_timeout)
+                except queue.Empty:
+                    if first:
+                        raise DeadlineExceeded(f"No response from upstream within its {deadline}s deadline")
+                    raise DeadlineExceeded(f"Upstream stream stalled for {idle_timeout}s")
+                if kind == "end":
+                    return
+                if kind == "error":
+                    raise value
+                first = False
+                yield value
+        finally:
+            # Also reached when the client disconnects and the stream is closed
+            stop.set()
+            if not producer.done():
+                self._abandon(producer)
+
+    def record_success(self, started):
+        """Record a successful upstream call with the metrics, breaker and hedge policy"""
+        self.observe_upstream(started)
+        if self.breaker is not None:
+            self.breaker.record_success()
+        if self.hedge is not None:
+            self.hedge.record(time.perf_counter() - started)
+
+    def record_failure(self, started, error):
+        """Record a failed upstream call with the metrics and breaker
+
+        Only timeouts and other transient errors count toward opening the
+        circuit. An error the upstream answered with, such as Gemini's
+        ValueError for a response blocked on safety grounds, shows it is up.
+        """
+        self.observe_upstream(started, error)
+        if self.breaker is not None:
+            if is_transient(error):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+    def release_probe(self):
+        """Free the breaker's probe after a call ended without an outcome
+
+        A cancelled request or a closed stream says nothing about the
+        upstream's health, but a half-open probe left unresolved would keep
+        the circuit rejecting every call.
+        """
+        if self.breaker is not None:
+            self.breaker.release_probe()
+
+    def retry_delay(self, attempt, error, expires_at):
+        """Seconds to back off before retrying, or None when the call should not be retried"""
+        if self.retry is None or not self.retry.should_retry(attempt, error):
+            return None
+        delay = self.retry.backoff(attempt)
+        if expires_at is not None and time.monotonic() + delay >= expires_at:
+            return None
+        self.retries += 1
+        UPSTREAM_RETRIES.inc(backend=self.backend.name)
+        return delay
+
+    def count_hedge(self):
+        self.hedged += 1
+        UPSTREAM_HEDGES.inc(backend=self.backend.name)
+
+    def observe_upstream(self, started, error=None):
+        """Record the latency and outcome of one upstream call"""
+        if error is None:
+            outcome = "success"
+        else:
+            outcome = "timeout" if is_timeout(error) else "error"
+            UPSTREAM_ERRORS.inc(backend=self.backend.name, kind=outcome)
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, backend=self.backend.name, outcome=outcome)
+
+    def stats(self):
+        """Return request coalescing and upstream concurrency counters"""
+        stats = self.single_flight.stats()
+        stats.update({
+            "upstream_in_flight": self.admission.active,
+            "upstream_queue_depth": self.admission.queue_depth,
+            "upstream_max_queue_depth": self.admission.max_queue_depth,
+            "max_concurrency": self.max_concurrency,
+            "admission": self.admission.stats(),
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "abandoned_running": self.abandoned_running
+        })
+        if self.breaker is not None:
+            stats["circuit"] = self.breaker.stats()
+        return stats
@@ -0,0 +1,161 @@
+import asyncio
+import bisect
+import random
+import threading
+import time
+from collections import deque
+import logging
+from llm_backend import BackendUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Exception class names the Gemini client and the stub raise for transient upstream failures
+TRANSIENT_ERROR_NAMES = frozenset([
+    "ServiceUnavailable",
+    "InternalServerError",
+    "TooManyRequests",
+    "ResourceExhausted",
+    "DeadlineExceeded",
+    "StubBackendError"
+])
+
+
+class DeadlineExceeded(TimeoutError):
+    """An upstream call did not finish within its deadline"""
+
+
+class CircuitOpenError(BackendUnavailable):
+    """Raised without calling the upstream while the circuit breaker is open"""
+
+
+def is_timeout(error):
+    """Whether an upstream exception represents a timeout or exceeded deadline"""
+    name = type(error).__name__.lower()
+    return isinstance(error, (TimeoutError, asyncio.TimeoutError)) or "timeout" in name or "deadline" in name
+
+
+def is_transient(error):
+    """Whether retrying an upstream call that raised this error may succeed"""
+    if isinstance(error, BackendUnavailable):
+        return False
+    return is_timeout(error) or isinstance(error, ConnectionError) or type(error).__name__ in TRANSIENT_ERROR_NAMES
+
+
+class RetryPolicy:
+    """Retry transient upstream failures with capped, fully jittered exponential backoff"""
+
+    def __init__(self, attempts=3, base_delay=0.2, max_delay=2.0, seed=None):
+        self.attempts = attempts  # Total tries, including the first
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+
+    def should_retry(self, attempt, error):
+        """Whether to try again after the given (1-based) attempt failed with error"""
+        return attempt < self.attempts and is_transient(error)
+
+    def backoff(self, attempt):
+        """Seconds to wait before the next try; jitter keeps clients from retrying in lockstep"""
+        return self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Fail fast while the upstream is unhealthy
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    are rejected for reset_timeout seconds. A single probe call is then let
+    through; its outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go upstream now"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if not self._probing and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._probing = True
+                logger.info("Circuit half-open, probing upstream")
+                return
+            self.rejected += 1
+        raise CircuitOpenError("Upstream circuit is open after repeated failures")
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Upstream recovered, closing circuit")
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+                logger.warning(f"Opening upstream circuit after {self._failures} consecutive failures")
+                self._opened_at = time.monotonic()
+                self._probing = False
+                self.opened += 1
+
+    def release_probe(self):
+        """Let another call probe when the probe ended without an outcome, such as a cancelled request"""
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "times_opened": self.opened,
+                "rejected": self.rejected
+            }
+
+
+class HedgePolicy:
+    """Send a second, identical request once the first is slower than a latency percentile"""
+
+    def __init__(self, percentile=0.95, min_samples=20, min_delay=0.05, window=500):
+        self.percentile = percentile
+        self.min_samples = min_samples  # No hedging until the percentile is meaningful
+        self.min_delay = min_delay
+        self._samples = deque(maxlen=window)
+        self._sorted = []
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """Add the latency of a successful upstream call to the rolling window"""
+        with self._lock:
+            if len(self._samples) == self._samples.maxlen:
+                oldest = self._samples[0]
+                del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+            self._samples.append(seconds)
+            bisect.insort(self._sorted, seconds)
+
+    def delay(self):
+        """Seconds to wait before hedging, or None while there are too few samples"""
+        with self._lock:
+            if len(self._sorted) < self.min_samples:
+                return None
+            index = min(int(len(self._sorted) * self.percentile), len(self._sorted) - 1)
+            return max(self._sorted[index], self.min_delay)
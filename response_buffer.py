@@ -0,0 +1,102 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseBuffer:
+    """Keep the undelivered chunks of each response server-side, keyed by a short id"""
+
+    def __init__(self, max_responses=1000, ttl=300):
+        self.max_responses = max_responses
+        self.ttl = ttl  # Seconds a response may sit unread before it is dropped
+
+        # response_id -> [chunks, cursor, expires_at, complete], oldest first.
+        # Incomplete responses are still being produced and may grow.
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def put(self, chunks, complete=True):
+        """Store the chunks of a response and return the id used to read them back
+
+        Pass complete=False when more chunks will be added with append().
+        """
+        response_id = secrets.token_urlsafe(8)
+        with self._lock:
+            self._expire(time.monotonic())
+            self._responses[response_id] = [list(chunks), 0, time.monotonic() + self.ttl, complete]
+
+            # Evict the least recently used responses once the buffer is full
+            while len(self._responses) > self.max_responses:
+                self._responses.popitem(last=False)
+                self.evictions += 1
+        return response_id
+
+    def append(self, response_id, chunks, complete=True):
+        """Add chunks to a response that is still being produced; False if it is gone"""
+        with self._lock:
+            entry = self._responses.get(response_id)
+            if entry is None:
+                return False
+            entry[0].extend(chunks)
+            entry[3] = complete
+            return True
+
+    def next_chunk(self, response_id):
+        """Return (chunk, has_more) for the next unread chunk, or None if the id is unknown
+
+        While a response is still being produced and has no unread chunk,
+        returns ("", True) so the client polls again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            entry = self._responses.get(response_id)
+            if entry is None:
+                return None
+            if entry[2] < now:
+                del self._responses[response_id]
+                self.expirations += 1
+                return None
+
+            chunks, cursor, _, complete = entry
+            if cursor >= len(chunks):
+                if complete:
+                    del self._responses[response_id]
+                    return '', False
+                entry[2] = now + self.ttl
+                return '', True
+            chunk = chunks[cursor]
+            cursor += 1
+
+            if cursor >= len(chunks) and complete:
+                del self._responses[response_id]
+                return chunk, False
+
+            entry[1] = cursor
+            entry[2] = now + self.ttl
+            self._responses.move_to_end(response_id)
+            return chunk, True
+
+    def _expire(self, now):
+        """Drop responses whose TTL has passed, oldest first"""
+        while self._responses:
+            response_id, entry = next(iter(self._responses.items()))
+            if entry[2] >= now:
+                break
+            del self._responses[response_id]
+            self.expirations += 1
+
+    def stats(self):
+        """Return buffer size and eviction counters"""
+        with self._lock:
+            return {
+                "buffered_responses": len(self._responses),
+                "buffered_chunks": sum(len(entry[0]) - entry[1] for entry in self._responses.values()),
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
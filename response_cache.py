@@ -0,0 +1,164 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace and case so trivially different prompts share a cache entry"""
+    return ' '.join(prompt.split()).lower()
+
+
+def prompt_key(prompt):
+    """Return a stable hash of the normalized prompt"""
+    return hashlib.sha256(normalize_prompt(prompt).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache of model responses: an in-memory LRU and an optional SQLite file"""
+
+    def __init__(self, max_entries=1000, ttl=3600, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl  # Default seconds an entry stays fresh
+
+        # key -> (response, expires_at), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.db_path = db_path
+        self._db = None
+        self._db_pid = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+                self._db = self._connect()
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS response_cache ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                self._db.commit()
+                logger.info(f"Response cache persisted to {db_path}")
+            except sqlite3.Error as e:
+                logger.error(f"Error opening response cache database: {str(e)}")
+                self._db = None
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        # WAL and a memory map let several worker processes share the disk tier
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA mmap_size=67108864")
+        self._db_pid = os.getpid()
+        return db
+
+    def _connection(self):
+        """Return the disk tier's connection, reopening it in a forked worker"""
+        if self._db is not None and self._db_pid != os.getpid():
+            self._db = self._connect()
+        return self._db
+
+    @property
+    def on_disk(self):
+        """True when lookups and stores may touch the SQLite tier"""
+        return self._db is not None
+
+    def make_key(self, prompt):
+        """Return the cache key for a rendered prompt"""
+        return prompt_key(prompt)
+
+    def get(self, prompt):
+        """Return the cached response for a prompt, or None on a miss"""
+        key = self.make_key(prompt)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+            row = self._db_get(key, now)
+            if row is not None:
+                # Promote the entry back into memory
+                self._store(key, row[0], row[1])
+                self.disk_hits += 1
+                return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, prompt, response, ttl=None):
+        """Cache a response; a ttl of 0 disables caching for this entry"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+
+        key = self.make_key(prompt)
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._store(key, response, expires_at)
+            self._db_set(key, response, expires_at)
+
+    def _store(self, key, response, expires_at):
+        """Insert into the memory tier, evicting the least recently used entries"""
+        self._entries[key] = (response, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _db_get(self, key, now):
+        db = self._connection()
+        if db is None:
+            return None
+        try:
+            row = db.execute(
+                "SELECT response, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[1] <= now:
+                db.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                db.commit()
+                return None
+            return row
+        except sqlite3.Error as e:
+            logger.error(f"Error reading response cache database: {str(e)}")
+            return None
+
+    def _db_set(self, key, response, expires_at):
+        db = self._connection()
+        if db is None:
+            return
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO response_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, response, expires_at)
+            )
+            db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error writing response cache database: {str(e)}")
+
+    def stats(self):
+        """Return hit, miss and eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "persistent": self._db is not None
+            }
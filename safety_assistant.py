@@ -1,43 +1,105 @@
 import os
-import google.generativeai as genai
 from datetime import datetime
 import json
 import re
 from dotenv import load_dotenv
 import logging
 import random
+import itertools
+import threading
+from session_manager import ConversationState
+from model_client import ModelClient
+from llm_backend import create_backend
+from intent_router import IntentRouter
+from tips_retriever import TipsRetriever
+from response_cache import ResponseCache
+from resilience import CircuitBreaker, RetryPolicy
+from admission import EMERGENCY, NORMAL, Overloaded
+from emergency_responses import EmergencyResponder
+from context_manager import ContextManager
+from metrics import REGISTRY, StageTimer
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Per-stage and per-handler latency, exposed on /metrics
+STAGE_SECONDS = REGISTRY.histogram(
+    "safety_chat_stage_seconds",
+    "Time spent in each stage of handling a chat message",
+    ["handler", "stage"]
+)
+HANDLER_SECONDS = REGISTRY.histogram(
+    "safety_chat_handler_seconds",
+    "Time to build a complete reply, by handler",
+    ["handler"]
+)
+FIRST_CONTENT_SECONDS = REGISTRY.histogram(
+    "safety_chat_first_content_seconds",
+    "Time until the first chunk of a reply is ready, by handler",
+    ["handler"]
+)
+
+# Knowledge base used to answer common questions without calling the model
+TIPS_CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'safety_tips.json')
+
+# Emergency numbers and immediate actions shown before the model's detailed answer
+EMERGENCY_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'emergency_actions.json')
+
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
+class SafetyAssistant:
+    # Seconds each handler's answers may be served from the response cache.
+    # Emergency guidance is only reused briefly so it never goes stale.
+    cache_ttls = {
+        "emergency": 60,
+        "health": 3600,
+        "general": 3600
+    }
 
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-    logger.info("Successfully configured Gemini API")
-except Exception as e:
-    logger.error(f"Error configuring Gemini API: {str(e)}")
-    raise
+    # Seconds each handler may spend upstream, retries included, before
+    # falling back to a local answer. Emergencies get the tightest budget.
+    deadlines = {
+        "emergency": 6.0,
+        "health": 20.0,
+        "general": 20.0
+    }
 
-class SafetyAssistant:
-    def __init__(self):
-        try:
-            self.model = genai.GenerativeModel('gemini-1.5-pro')
-            logger.info("Successfully initialized Gemini model")
-        except Exception as e:
-            logger.error(f"Error initializing Gemini model: {str(e)}")
-            raise
+    # Seconds a streamed answer may go without a new piece once it has started;
+    # the deadline above bounds the wait for the first piece
+    stream_idle_timeout = 10.0
+
+    # Keywords for each handler, highest priority first
+    intent_keywords = [
+        ("emergency", ["emergency", "help", "danger", "unsafe"]),
+        ("tips", ["safety tips", "guidelines", "advice"]),
+        ("health", ["first aid", "medical", "health", "symptom", "symptoms"])
+    ]
+
+    def __init__(self, backend=None, cache=None, coalesce_window=0.0, max_concurrency=32, retriever=None,
+                 breaker=None, retry=None, hedge=None, admission=None, emergency_responder=None,
+                 context_manager=None, client=None):
+        # Bots served together pass in one shared ModelClient; otherwise build one
+        # here, with Gemini as the backend unless LLM_BACKEND selects another one
+        if client is None:
+            client = ModelClient(
+                backend if backend is not None else create_backend(),
+                cache if cache is not None else ResponseCache(),
+                coalesce_window=coalesce_window,
+                max_concurrency=max_concurrency,
+                breaker=breaker if breaker is not None else CircuitBreaker(),
+                retry=retry if retry is not None else RetryPolicy(),
+                hedge=hedge,
+                admission=admission
+            )
+        self.client = client
+        self.backend = client.backend
+        
+        # Started at most once, by app startup or the first /ready check
+        self._warm_up_thread = None
+        self._warm_up_lock = threading.Lock()
         
-        self.conversation_history = []
-        self.last_question_asked = None
-        self.question_count = 0
+        # Conversation state used when no per-session state is passed in
+        self.state = ConversationState()
         self.safety_categories = [
             "Emergency Response",
             "Fire Safety",
@@ -51,6 +113,21 @@ class SafetyAssistant:
             "First Aid"
         ]
         
+        # Local retrieval fast path; the model is only called on a miss
+        if retriever is None and os.path.exists(TIPS_CORPUS_PATH):
+            retriever = TipsRetriever.from_file(TIPS_CORPUS_PATH)
+        self.retriever = retriever
+        
+        if emergency_responder is None and os.path.exists(EMERGENCY_TABLE_PATH):
+            emergency_responder = EmergencyResponder.from_file(EMERGENCY_TABLE_PATH)
+        self.emergency_responder = emergency_responder
+        
+        # Recent turns and a rolling summary, kept within a token budget
+        self.context_manager = context_manager if context_manager is not None else ContextManager()
+        
+        # Keywords and category names compiled into one matcher
+        self.router = IntentRouter(self.intent_keywords, self.safety_categories)
+        
         # Varied questions to avoid repetition
         self.varied_questions = [
             "Would you like to learn more about emergency procedures?",
@@ -65,8 +142,6 @@ class SafetyAssistant:
             "Should we discuss health and hygiene practices?"
         ]
         
-        # Track previously suggested ideas to avoid repetition
-        self.previous_suggestions = set()
         self.safety_themes = [
             "Emergency Preparedness",
             "Prevention First",
@@ -108,35 +183,105 @@ class SafetyAssistant:
             ]
         }
     
-    def generate_content_safely(self, prompt):
+    def start_warm_up(self):
+        """Configure the model client in a background thread so startup does not wait for it
+        
+        Later calls do nothing, so this is safe to call on every readiness check.
+        """
+        warm_up = getattr(self.backend, "warm_up", None)
+        if warm_up is None:
+            return
+        with self._warm_up_lock:
+            if self._warm_up_thread is None:
+                self._warm_up_thread = threading.Thread(target=warm_up, name="model-warm-up", daemon=True)
+                self._warm_up_thread.start()
+
+    def upstream_ready(self):
+        """Whether the model client is configured and warm"""
+        return getattr(self.backend, "ready", True)
+
+    def upstream_available(self):
+        """False once the model client is known to be unusable"""
+        return getattr(self.backend, "available", True)
+
+    def offline_response(self, user_message, state, category=None):
+        """Answer from local tips when the model is unavailable"""
+        if self.retriever is not None:
+            # Any match beats none while the model is down
+            local_answer = self.retriever.answer(user_message, threshold=0.0, require_coverage=False)
+            if local_answer:
+                return local_answer + "\n" + self.get_varied_question(state)
+        return self.provide_safety_tips(user_message, state, category)
+
+    def fallback_response(self, user_message, handler, state):
+        """Local answer used when the model fails, times out or its circuit is open"""
+        category = "Emergency Response" if handler == "emergency" else None
+        return ("⚠️ I can't reach the safety assistant right now, so here is some guidance I have offline:\n\n"
+                + self.offline_response(user_message, state, category))
+
+    def is_emergency(self, user_message):
+        """Whether a message routes to the emergency handler"""
+        return self.router.route(user_message)[0] == "emergency"
+
+    def priority_for(self, handler):
+        """Admission priority for a handler's model calls; emergencies jump the queue"""
+        return EMERGENCY if handler == "emergency" else NORMAL
+
+    def generate_or_fallback(self, handler, prompt, user_message, state, cache_ttl=None):
+        """Return (handler, response) from the model, or from local tips if the model fails"""
+        try:
+            return handler, self.client.generate(
+                prompt, cache_ttl, self.deadlines.get(handler), self.priority_for(handler)
+            )
+        except Overloaded as e:
+            logger.warning(f"Answering {handler} message locally under load: {str(e)}")
+            return "shed", self.fallback_response(user_message, handler, state)
+        except Exception as e:
+            logger.error(f"Error generating content: {str(e)}")
+            return "fallback", self.fallback_response(user_message, handler, state)
+
+    async def agenerate_or_fallback(self, handler, prompt, user_message, state, cache_ttl=None):
+        """Await (handler, response) from the model, or from local tips if the model fails"""
+        try:
+            return handler, await self.client.agenerate(
+                prompt, cache_ttl, self.deadlines.get(handler), self.priority_for(handler)
+            )
+        except Overloaded as e:
+            logger.warning(f"Answering {handler} message locally under load: {str(e)}")
+            return "shed", self.fallback_response(user_message, handler, state)
+        except Exception as e:
+            logger.error(f"Error generating content: {str(e)}")
+            return "fallback", self.fallback_response(user_message, handler, state)
+
+    def generate_content_safely(self, prompt, cache_ttl=None, deadline=None):
         """Safely generate content with error handling"""
         try:
-            logger.debug(f"Sending prompt to Gemini API: {prompt[:100]}...")
-            response = self.model.generate_content(prompt)
-            logger.debug("Successfully received response from Gemini API")
-            return response.text
+            return self.client.generate(prompt, cache_ttl, deadline)
         except Exception as e:
             logger.error(f"Error generating content: {str(e)}")
             return f"I apologize, but I encountered an error: {str(e)}. Please try again or rephrase your question."
 
-    def get_varied_question(self):
+    def get_varied_question(self, state=None):
         """Get a varied question that hasn't been asked recently"""
-        if self.question_count >= 2:
-            available_questions = [q for q in self.varied_questions if q != self.last_question_asked]
+        if state is None:
+            state = self.state
+        
+        if state.question_count >= 2:
+            available_questions = [q for q in self.varied_questions if q != state.last_question_asked]
             if available_questions:
                 question = random.choice(available_questions)
             else:
                 question = self.generate_new_question()
-            self.question_count = 0
+            state.question_count = 0
         else:
             question = random.choice(self.varied_questions)
             
-        if question == self.last_question_asked:
-            self.question_count += 1
+        if question == state.last_question_asked:
+            state.question_count += 1
         else:
-            self.question_count = 0
+            state.question_count = 0
             
-        self.last_question_asked = question
+        state.last_question_asked = question
         return question
 
     def generate_new_question(self):
@@ -158,99 +303,338 @@ class SafetyAssistant:
 
     def chunk_response(self, response):
         """Split a response into smaller, manageable chunks"""
-        chunks = []
+        return list(self.iter_chunks([response]))
+
+    def iter_chunks(self, pieces):
+        """Incrementally split streamed text into chunks as complete lines arrive"""
         current_chunk = []
         current_length = 0
         max_chunk_length = 150  # Maximum characters per chunk
+        pending = ''
         
-        # Split response into lines
-        lines = response.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # If adding this line would exceed max length, start a new chunk
-            if current_length + len(line) > max_chunk_length and current_chunk:
-                chunks.append('\n'.join(current_chunk))
-                current_chunk = []
-                current_length = 0
+        # A trailing newline flushes whatever partial line is left at the end
+        for piece in itertools.chain(pieces, ['\n']):
+            pending += piece
+            *lines, pending = pending.split('\n')
             
-            current_chunk.append(line)
-            current_length += len(line)
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                    
+                # If adding this line would exceed max length, emit the current chunk
+                if current_length + len(line) > max_chunk_length and current_chunk:
+                    yield '\n'.join(current_chunk)
+                    current_chunk = []
+                    current_length = 0
+                
+                current_chunk.append(line)
+                current_length += len(line)
         
-        # Add the last chunk if it exists
+        # Emit the last chunk if it exists
         if current_chunk:
-            chunks.append('\n'.join(current_chunk))
+            yield '\n'.join(current_chunk)
+
+    def plan_response(self, user_message, state, timer=None):
+        """Route a message to a handler and return (handler, prompt, response, cache_ttl)
         
-        return chunks
+        Exactly one of prompt and response is set: handlers answered locally
+        return the response text, the others return the prompt to send to the
+        model and the TTL to cache its answer for. A prompt carrying conversation
+        context is unique to one conversation, so its TTL is 0: caching it would
+        only evict reusable first-turn answers.
+        """
+        if timer is None:
+            timer = StageTimer()
+        
+        intent, category = self.router.route(user_message)
+        timer.mark("route")
+        
+        # Check for specific safety-related queries
+        if intent == "emergency":
+            if not self.upstream_available():
+                response = self.offline_response(user_message, state, "Emergency Response")
+                if self.emergency_responder is not None:
+                    response = self.emergency_responder.respond(user_message) + "\n\n" + response
+                timer.mark("local")
+                return "offline", None, response, None
+            context = self.context_manager.build(state, user_message)
+            prompt = self.build_emergency_prompt(user_message, context)
+            self.context_manager.record_prompt("emergency", prompt)
+            timer.mark("prompt")
+            return "emergency", prompt, None, self.cache_ttl_for("emergency", context)
+        
+        # Answer common questions from the local knowledge base when it is confident
+        if self.retriever is not None:
+            local_answer = self.retriever.answer(user_message)
+            timer.mark("retrieval")
+            if local_answer:
+                return "retrieval", None, local_answer + "\n" + self.get_varied_question(state), None
+        
+        if intent == "tips":
+            response = self.provide_safety_tips(user_message, state, category)
+            timer.mark("local")
+            return "tips", None, response, None
+        
+        # Degrade to the offline tips path rather than erroring on every message
+        if not self.upstream_available():
+            response = self.offline_response(user_message, state, category)
+            timer.mark("local")
+            return "offline", None, response, None
+        
+        handler = "health" if intent == "health" else "general"
+        context = self.context_manager.build(state, user_message)
+        if handler == "health":
+            prompt = self.build_health_prompt(user_message, context)
+        else:
+            prompt = self.build_general_prompt(user_message, context)
+        self.context_manager.record_prompt(handler, prompt)
+        timer.mark("prompt")
+        return handler, prompt, None, self.cache_ttl_for(handler, context)
 
-    def process_message(self, user_message):
-        """Process user messages and generate appropriate responses"""
+    def cache_ttl_for(self, handler, context):
+        """Seconds to cache a model answer; 0 skips the cache for context-specific prompts"""
+        return 0 if context else self.cache_ttls.get(handler)
+
+    def record_timings(self, handler, timer):
+        """Report a message's stage timings to the latency histograms"""
+        timer.observe(STAGE_SECONDS, handler=handler)
+        HANDLER_SECONDS.observe(sum(seconds for _, seconds in timer.stages), handler=handler)
+
+    def process_message(self, user_message, state=None, defer_detail=False):
+        """Process user messages and generate appropriate responses
+        
+        With defer_detail, emergency messages return the local guidance at once
+        and a "detail" callable that produces the model's answer as later chunks.
+        """
+        if state is None:
+            state = self.state
+        
         try:
+            timer = StageTimer()
+            
             # Add message to conversation history
-            self.conversation_history.append({"role": "user", "content": user_message})
+            state.add_turn("user", user_message)
             
-            # Check for specific safety-related queries
-            if any(keyword in user_message.lower() for keyword in ["emergency", "help", "danger", "unsafe"]):
-                response = self.handle_emergency_query(user_message)
-            elif any(keyword in user_message.lower() for keyword in ["safety tips", "guidelines", "advice"]):
-                response = self.provide_safety_tips(user_message)
-            elif any(keyword in user_message.lower() for keyword in ["first aid", "medical", "health"]):
-                response = self.handle_health_query(user_message)
-            else:
-                prompt = f"""
-                You are a helpful safety assistant. Help the user with their safety-related queries.
-                Available safety categories: {', '.join(self.safety_categories)}
+            handler, prompt, response, cache_ttl = self.plan_response(user_message, state, timer)
+            if handler == "emergency" and defer_detail and self.emergency_responder is not None:
+                result, instant = self.instant_response(user_message, timer)
                 
-                User query: {user_message}
+                def detail():
+                    detail_handler, detail_response = self.generate_or_fallback(
+                        handler, prompt, user_message, state, cache_ttl
+                    )
+                    timer.mark("upstream")
+                    return self.finish_detail(detail_handler, instant, detail_response, state, timer)
                 
-                Provide a clear and structured response that:
-                1. Starts with a brief, engaging introduction (1 sentence)
-                2. Uses emojis to make the response more visually appealing
-                3. Organizes information in clear subpoints with bullet points
-                4. Includes specific safety tips and guidelines
-                5. Uses clear and direct language
-                6. Emphasizes important safety information
-                7. Does not include a question at the end
+                result["detail"] = detail
+                return result
+            
+            if response is None:
+                handler, response = self.generate_or_fallback(handler, prompt, user_message, state, cache_ttl)
+                timer.mark("upstream")
+            
+            result = self.finish_response(handler, response, state)
+            timer.mark("chunk")
+            FIRST_CONTENT_SECONDS.observe(timer.elapsed(), handler=handler)
+            self.record_timings(handler, timer)
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error processing message: {str(e)}")
+            return self.error_response(e)
+
+    async def aprocess_message(self, user_message, state=None, defer_detail=False):
+        """Process a user message without blocking the event loop while the model responds
+        
+        With defer_detail, emergency messages return the local guidance at once
+        and a "detail" coroutine function that produces the model's answer as later chunks.
+        """
+        if state is None:
+            state = self.state
+        
+        try:
+            timer = StageTimer()
+            state.add_turn("user", user_message)
+            
+            handler, prompt, response, cache_ttl = self.plan_response(user_message, state, timer)
+            if handler == "emergency" and defer_detail and self.emergency_responder is not None:
+                result, instant = self.instant_response(user_message, timer)
                 
-                Format your response as:
-                - Main response with emoji (1 sentence)
-                - Subpoint 1: [emoji] Detail
-                - Subpoint 2: [emoji] Detail
-                - Subpoint 3: [emoji] Detail
-                - No paragraphs or long text blocks
-                """
-                response = self.generate_content_safely(prompt)
+                async def detail():
+                    detail_handler, detail_response = await self.agenerate_or_fallback(
+                        handler, prompt, user_message, state, cache_ttl
+                    )
+                    timer.mark("upstream")
+                    return self.finish_detail(detail_handler, instant, detail_response, state, timer)
                 
-                # Add a varied question at the end
-                response += "\n\n" + self.get_varied_question()
+                result["detail"] = detail
+                return result
             
-            # Split response into chunks
-            response_chunks = self.chunk_response(response)
+            if response is None:
+                handler, response = await self.agenerate_or_fallback(
+                    handler, prompt, user_message, state, cache_ttl
+                )
+                timer.mark("upstream")
             
-            # Add response to conversation history
-            self.conversation_history.append({"role": "assistant", "content": response})
-            
-            # Return the first chunk with a flag indicating more chunks are available
-            return {
-                "chunk": response_chunks[0],
-                "has_more": len(response_chunks) > 1,
-                "remaining_chunks": response_chunks[1:] if len(response_chunks) > 1 else []
-            }
+            result = self.finish_response(handler, response, state)
+            timer.mark("chunk")
+            FIRST_CONTENT_SECONDS.observe(timer.elapsed(), handler=handler)
+            self.record_timings(handler, timer)
+            return result
             
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}")
-            return {
-                "chunk": f"I apologize, but I encountered an error: {str(e)}. Please try again or rephrase your question.",
-                "has_more": False,
-                "remaining_chunks": []
-            }
+            return self.error_response(e)
+
+    def finish_response(self, handler, response, state):
+        """Record the response and split it into the first chunk and the remaining chunks"""
+        # Add a varied question at the end of general answers
+        if handler == "general":
+            response += "\n\n" + self.get_varied_question(state)
+        
+        # Split response into chunks
+        response_chunks = self.chunk_response(response)
+        
+        # Add response to conversation history
+        state.add_turn("assistant", response)
+        
+        # Return the first chunk with a flag indicating more chunks are available
+        return {
+            "chunk": response_chunks[0],
+            "has_more": len(response_chunks) > 1,
+            "remaining_chunks": response_chunks[1:] if len(response_chunks) > 1 else []
+        }
+
+    def instant_response(self, user_message, timer):
+        """Return (result, text) for the precomputed emergency guidance sent before the model answers"""
+        instant = self.emergency_responder.respond(user_message)
+        timer.mark("instant")
+        FIRST_CONTENT_SECONDS.observe(timer.elapsed(), handler="emergency")
+        return {"chunk": instant, "has_more": True, "remaining_chunks": []}, instant
+
+    def finish_detail(self, handler, instant, response, state, timer):
+        """Record a deferred emergency answer and return its chunks"""
+        state.add_turn("assistant", instant + "\n\n" + response)
+        chunks = self.chunk_response(response)
+        timer.mark("chunk")
+        self.record_timings(handler, timer)
+        return chunks
+
+    def error_response(self, error):
+        """Build the chunked reply returned when processing fails"""
+        return {
+            "chunk": f"I apologize, but I encountered an error: {str(error)}. Please try again or rephrase your question.",
+            "has_more": False,
+            "remaining_chunks": []
+        }
+
+    def stream_message(self, user_message, state=None):
+        """Process a user message and yield response chunks as the model generates them"""
+        if state is None:
+            state = self.state
+        
+        timer = StageTimer()
+        state.add_turn("user", user_message)
+        parts = []
+        
+        try:
+            handler, prompt, response, cache_ttl = self.plan_response(user_message, state, timer)
+            first = True
+            
+            # Emergency numbers and actions go out before the model starts
+            if handler == "emergency" and response is None and self.emergency_responder is not None:
+                _, instant = self.instant_response(user_message, timer)
+                first = False
+                parts.append(instant + "\n\n")
+                yield instant
+            
+            pieces = self._response_pieces(handler, prompt, response, cache_ttl, parts, state, user_message)
+            for chunk in self.iter_chunks(pieces):
+                if first:
+                    first = False
+                    FIRST_CONTENT_SECONDS.observe(timer.elapsed(), handler=handler)
+                yield chunk
+            timer.mark("stream")
+        except Exception as e:
+            logger.error(f"Error streaming message: {str(e)}")
+            yield f"I apologize, but I encountered an error: {str(e)}. Please try again or rephrase your question."
+            return
+        
+        state.add_turn("assistant", ''.join(parts))
+        self.record_timings(handler, timer)
+
+    def _response_pieces(self, handler, prompt, response, cache_ttl, parts, state, user_message):
+        """Yield the response text as it becomes available, recording it in parts"""
+        if response is not None:
+            pieces = [response]
+        else:
+            pieces = self.client.stream(
+                prompt, cache_ttl, self.priority_for(handler),
+                deadline=self.deadlines.get(handler), idle_timeout=self.stream_idle_timeout
+            )
+        received = False
+        try:
+            for piece in pieces:
+                received = True
+                parts.append(piece)
+                yield piece
+        except Exception as e:
+            logger.error(f"Error streaming content: {str(e)}")
+            # Until the model's first piece reaches the client a local answer can replace the stream
+            if received:
+                piece = f"\nI apologize, but I encountered an error: {str(e)}. Please try again or rephrase your question."
+            else:
+                piece = self.fallback_response(user_message, handler, state)
+            parts.append(piece)
+            yield piece
+            return
+        
+        if handler == "general":
+            question = "\n\n" + self.get_varied_question(state)
+            parts.append(question)
+            yield question
+
+    def build_general_prompt(self, user_message, context=""):
+        """Build the prompt for general safety queries"""
+        return f"""
+        You are a helpful safety assistant. Help the user with their safety-related queries.
+        Available safety categories: {', '.join(self.safety_categories)}
+        {self.format_context(context)}
+        User query: {user_message}
+        
+        Provide a clear and structured response that:
+        1. Starts with a brief, engaging introduction (1 sentence)
+        2. Uses emojis to make the response more visually appealing
+        3. Organizes information in clear subpoints with bullet points
+        4. Includes specific safety tips and guidelines
+        5. Uses clear and direct language
+        6. Emphasizes important safety information
+        7. Does not include a question at the end
+        
+        Format your response as:
+        - Main response with emoji (1 sentence)
+        - Subpoint 1: [emoji] Detail
+        - Subpoint 2: [emoji] Detail
+        - Subpoint 3: [emoji] Detail
+        - No paragraphs or long text blocks
+        """
+
+    def format_context(self, context):
+        """Place conversation context in a prompt so follow-up questions make sense"""
+        if not context:
+            return ""
+        return f"\n        Use this conversation for context:\n{context}\n"
 
     def handle_emergency_query(self, user_message):
         """Handle emergency-related queries"""
-        prompt = f"""
+        return self.generate_content_safely(
+            self.build_emergency_prompt(user_message), self.cache_ttls["emergency"], self.deadlines["emergency"]
+        )
+
+    def build_emergency_prompt(self, user_message, context=""):
+        """Build the prompt for emergency-related queries"""
+        return f"""{self.format_context(context)}
         The user has indicated an emergency situation: {user_message}
         
         Provide immediate safety guidance that:
@@ -267,16 +651,12 @@ class SafetyAssistant:
         - Emergency Contacts
         - Next Steps
         """
-        return self.generate_content_safely(prompt)
 
-    def provide_safety_tips(self, user_message):
+    def provide_safety_tips(self, user_message, state=None, category=None):
         """Provide relevant safety tips based on the query"""
         # Determine the most relevant category
-        category = None
-        for cat in self.safety_categories:
-            if cat.lower() in user_message.lower():
-                category = cat
-                break
+        if not category:
+            _, category = self.router.route(user_message)
         
         if not category:
             category = random.choice(self.safety_categories)
@@ -292,12 +672,18 @@ class SafetyAssistant:
         for tip in tips:
             response += f"• {tip}\n"
         
-        response += "\n" + self.get_varied_question()
+        response += "\n" + self.get_varied_question(state)
         return response
 
     def handle_health_query(self, user_message):
         """Handle health and medical-related queries"""
-        prompt = f"""
+        return self.generate_content_safely(
+            self.build_health_prompt(user_message), self.cache_ttls["health"], self.deadlines["health"]
+        )
+
+    def build_health_prompt(self, user_message, context=""):
+        """Build the prompt for health and medical-related queries"""
+        return f"""{self.format_context(context)}
         The user has a health-related query: {user_message}
         
         Provide health and safety guidance that:
@@ -314,4 +700,3 @@ class SafetyAssistant:
         - First Aid Steps (if applicable)
         - When to Seek Medical Help
         """
-        return self.generate_content_safely(prompt) 
\ No newline at end of file
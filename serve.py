@@ -0,0 +1,183 @@
+"""Prefork launcher: load the app once, then fork workers that share one listening socket.
+
+The tips corpus, emergency table, routers and templates are loaded before
+forking, so each worker starts with them already in memory. Sessions, rate
+limits and buffered chunks are kept in a shared SQLite file (SHARED_STATE_DB)
+so any worker can serve any request. Upstream admission is per worker.
+
+Metrics are per worker too, and every sample carries a worker="N" label.
+/metrics on the shared port answers from whichever worker accepts the
+connection, so scrape the workers directly instead: with --metrics-port P,
+worker N serves its own /metrics on port P+N. A restarted worker keeps its
+number and port, so Prometheus sees an ordinary counter reset.
+
+Run with: python serve.py --workers 4 --port 5000 --metrics-port 9100
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies sooner than this after starting is restarted after a pause
+MIN_WORKER_LIFETIME = 1.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the safety assistant from several worker processes")
+    parser.add_argument('--host', default=os.getenv('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '5000')))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WORKERS', str(os.cpu_count() or 1))))
+    parser.add_argument('--backlog', type=int, default=1024, help="Pending connections the socket queues")
+    parser.add_argument('--upstream-limit', type=int, default=None,
+                        help="Concurrent model calls across all workers, divided evenly between them")
+    parser.add_argument('--metrics-port', type=int, default=int(os.getenv('METRICS_PORT', '0')) or None,
+                        help="Worker N serves its own /metrics on this port plus N")
+    return parser.parse_args()
+
+
+def serve_metrics(host, port):
+    """Serve this worker's metrics on a port of its own so each worker can be scraped directly"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from metrics import REGISTRY
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Worker {os.getpid()} serving metrics on http://{host}:{port}/metrics")
+
+
+def run_worker(application, sock, warm_up, index, metrics_port):
+    """Serve requests from the shared socket until told to stop"""
+    def stop(signum, frame):
+        # Raising SystemExit unwinds serve_forever
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    from werkzeug.serving import make_server
+    from metrics import REGISTRY
+
+    # Keeps each worker's counters and histograms apart wherever they are scraped
+    REGISTRY.const_labels = {"worker": str(index)}
+    if metrics_port:
+        serve_metrics(sock.getsockname()[0], metrics_port + index)
+    if warm_up:
+        application.assistant.start_warm_up()
+    server = make_server(sock.getsockname()[0], sock.getsockname()[1], application.app, threaded=True,
+                         fd=sock.fileno())
+    logger.info(f"Worker {os.getpid()} serving")
+    try:
+        server.serve_forever()
+    finally:
+        # Workers exit without running atexit handlers, so queued conversation turns are written here
+        if application.conversation_store is not None:
+            application.conversation_store.close()
+
+
+def main():
+    args = parse_args()
+    if not hasattr(os, 'fork'):
+        sys.exit("serve.py needs os.fork; on this platform run a single process with: python app.py")
+    workers = max(args.workers, 1)
+
+    # The model client is configured in each worker; a warm-up thread would not survive the fork
+    warm_up = os.getenv('MODEL_WARMUP', '1') != '0'
+    os.environ['MODEL_WARMUP'] = '0'
+    os.environ.setdefault(
+        'SHARED_STATE_DB',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Instance', 'shared_state.db')
+    )
+    if args.upstream_limit:
+        os.environ['MAX_UPSTREAM_CONCURRENCY'] = str(max(args.upstream_limit // workers, 1))
+
+    import app as application
+    application.app.jinja_env.get_template('chat.html')
+
+    sock = socket.create_server((args.host, args.port), backlog=args.backlog)
+    sock.set_inheritable(True)
+    logger.info(f"Listening on http://{args.host}:{args.port} with {workers} workers")
+
+    children = {}  # pid -> (worker number, start time)
+    stopping = False
+
+    def spawn(index):
+        # Output still buffered at the fork would otherwise be written by both processes
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                run_worker(application, sock, warm_up, index, args.metrics_port)
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 0 if e.code is None else 1
+            except BaseException:
+                logger.exception(f"Worker {index} failed")
+            finally:
+                # Never fall back into the supervisor loop or run the supervisor's atexit handlers
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        children[pid] = (index, time.monotonic())
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for index in range(workers):
+        spawn(index)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        child = children.pop(pid, None)
+        if stopping or child is None:
+            continue
+
+        index, started = child
+        logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+        if time.monotonic() - started < MIN_WORKER_LIFETIME:
+            time.sleep(MIN_WORKER_LIFETIME)
+        if not stopping:
+            spawn(index)
+
+    sock.close()
+    logger.info("All workers stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import OrderedDict, deque
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationTurn:
+    """A single message in a conversation"""
+
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role, content, timestamp=None):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp if timestamp is not None else time.time()
+
+
+class ConversationState:
+    """Per-session conversation state with a bounded turn history"""
+
+    __slots__ = (
+        "session_id",
+        "history",
+        "last_question_asked",
+        "question_count",
+        "previous_suggestions",
+        "last_seen",
+        "store",
+        "summary",
+        "summarized_until",
+        "data"
+    )
+
+    def __init__(self, session_id=None, max_turns=20, store=None):
+        self.session_id = session_id
+        self.store = store  # Optional ConversationStore that persists each turn
+        # Compact summary of turns older than the prompt's context window
+        self.summary = ""
+        self.summarized_until = 0.0
+        # Oldest turns fall off once the ring buffer is full
+        self.history = deque(maxlen=max_turns)
+        self.last_question_asked = None
+        self.question_count = 0
+        self.previous_suggestions = set()
+        self.last_seen = time.monotonic()
+        # JSON-serializable values a bot keeps with the conversation, such as trip details
+        self.data = {}
+
+    def add_turn(self, role, content):
+        """Append a turn to the conversation history"""
+        turn = ConversationTurn(role, content)
+        self.history.append(turn)
+        if self.store is not None and self.session_id is not None:
+            self.store.append(self.session_id, role, content, turn.timestamp)
+
+    def restore(self, turns):
+        """Load (role, content, timestamp) turns saved by an earlier process"""
+        for role, content, timestamp in turns:
+            self.history.append(ConversationTurn(role, content, timestamp))
+
+    def to_dict(self):
+        """Plain-data form of the state for sharing between processes"""
+        return {
+            "history": [[turn.role, turn.content, turn.timestamp] for turn in self.history],
+            "last_question_asked": self.last_question_asked,
+            "question_count": self.question_count,
+            "previous_suggestions": list(self.previous_suggestions),
+            "summary": self.summary,
+            "summarized_until": self.summarized_until,
+            "data": self.data
+        }
+
+    @classmethod
+    def from_dict(cls, data, session_id=None, max_turns=20, store=None):
+        """Rebuild a state saved with to_dict"""
+        state = cls(session_id, max_turns=max_turns, store=store)
+        state.restore(data["history"])
+        state.last_question_asked = data["last_question_asked"]
+        state.question_count = data["question_count"]
+        state.previous_suggestions = set(data["previous_suggestions"])
+        state.summary = data["summary"]
+        state.summarized_until = data["summarized_until"]
+        # States saved before bots kept data on them have none
+        state.data = data.get("data", {})
+        return state
+
+    def approx_size(self):
+        """Approximate number of bytes of message text held by this session"""
+        return sum(len(turn.content) for turn in self.history)
+
+
+class SessionManager:
+    """Hand out per-session conversation state and evict idle sessions by LRU and TTL"""
+
+    def __init__(self, max_sessions=10000, ttl=1800, max_turns=20, store=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl  # Seconds of inactivity before a session is dropped
+        self.max_turns = max_turns
+        # Sessions evicted from memory, or from before a restart, are reloaded from here
+        self.store = store
+
+        # session_id -> ConversationState, least recently used first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rehydrated = 0
+
+    def get(self, session_id):
+        """Return the state for a session, creating or rehydrating it if needed"""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+
+            state = self._sessions.get(session_id)
+            if state is not None:
+                self._sessions.move_to_end(session_id)
+                state.last_seen = now
+                return state
+
+        # Read saved turns outside the lock so other sessions are not held up
+        turns = self.store.recent_turns(session_id, self.max_turns) if self.store is not None else []
+
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = ConversationState(session_id, max_turns=self.max_turns, store=self.store)
+                if turns:
+                    state.restore(turns)
+                    self.rehydrated += 1
+                self._sessions[session_id] = state
+                self.created += 1
+
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._sessions.move_to_end(session_id)
+
+            state.last_seen = now
+            return state
+
+    def save(self, state):
+        """Persist a session's state after a request; in-memory sessions need nothing"""
+
+    def _expire(self, now):
+        """Drop sessions that have been idle for longer than the TTL"""
+        while self._sessions:
+            session_id, state = next(iter(self._sessions.items()))
+            if now - state.last_seen < self.ttl:
+                break
+            del self._sessions[session_id]
+            self.expirations += 1
+
+    def stats(self):
+        """Return session counts and memory counters"""
+        with self._lock:
+            return {
+                "active_sessions": len(self._sessions),
+                "sessions_created": self.created,
+                "sessions_evicted": self.evictions,
+                "sessions_expired": self.expirations,
+                "sessions_rehydrated": self.rehydrated,
+                "stored_turns": sum(len(state.history) for state in self._sessions.values()),
+                "stored_bytes": sum(state.approx_size() for state in self._sessions.values())
+            }
@@ -0,0 +1,327 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import logging
+from session_manager import ConversationState
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY, data TEXT NOT NULL, version INTEGER NOT NULL, last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_last_seen ON sessions (last_seen);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buffered_responses (
+    response_id TEXT PRIMARY KEY, cursor INTEGER NOT NULL, size INTEGER NOT NULL,
+    complete INTEGER NOT NULL, expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_buffered_responses_expires ON buffered_responses (expires_at);
+CREATE TABLE IF NOT EXISTS buffered_chunks (
+    response_id TEXT NOT NULL, seq INTEGER NOT NULL, chunk TEXT NOT NULL, PRIMARY KEY (response_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class SharedStore:
+    """SQLite file in WAL mode, memory-mapped, that worker processes share for cross-request state
+
+    Each thread of each process gets its own connection, opened on first use,
+    so a store created before the server forks is safe to use in every worker.
+    """
+
+    def __init__(self, path, mmap_size=64 * 1024 * 1024, busy_timeout=5000):
+        self.path = path
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout  # Milliseconds to wait for another writer
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        db = self._connect()
+        db.executescript(SCHEMA)
+        db.close()
+        logger.info(f"Sharing sessions, rate limits and buffered responses through {path}")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000, isolation_level=None,
+                             check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        db.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+        return db
+
+    def connection(self):
+        """Return this thread's connection, reopening it after a fork"""
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = self._local.db = self._connect()
+            self._local.pid = os.getpid()
+        return db
+
+    @contextmanager
+    def transaction(self):
+        """Run statements atomically, taking the write lock up front to avoid upgrade deadlocks"""
+        db = self.connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+
+class SharedSessionManager:
+    """SessionManager whose conversation state is shared by every worker process
+
+    A worker keeps decoded states it has seen and only reloads one when
+    another worker has saved a newer version. Concurrent requests for the
+    same session are last-writer-wins.
+    """
+
+    def __init__(self, shared, max_sessions=10000, ttl=1800, max_turns=20, store=None):
+        self.shared = shared
+        self.max_sessions = max_sessions  # Decoded states kept by this worker
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.store = store  # Optional ConversationStore for turn history beyond the TTL
+
+        # session_id -> (state, version) decoded by this worker
+        self._local = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.rehydrated = 0
+        self.saves = 0
+
+    def get(self, session_id):
+        """Return the state for a session, loading the latest saved version"""
+        now = time.time()
+        row = self.shared.connection().execute(
+            "SELECT data, version, last_seen FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+
+        with self._lock:
+            cached = self._local.get(session_id)
+        if row is not None and row[2] >= now - self.ttl:
+            if cached is not None and cached[1] == row[1]:
+                return cached[0]
+            state = ConversationState.from_dict(json.loads(row[0]), session_id, self.max_turns, self.store)
+            version = row[1]
+        else:
+            state = ConversationState(session_id, max_turns=self.max_turns, store=self.store)
+            version = 0
+            if self.store is not None:
+                turns = self.store.recent_turns(session_id, self.max_turns)
+                if turns:
+                    state.restore(turns)
+                    self.rehydrated += 1
+            self.created += 1
+
+        self._remember(session_id, state, version)
+        return state
+
+    def save(self, state):
+        """Publish a session's state to the other workers"""
+        now = time.time()
+        data = json.dumps(state.to_dict())
+        with self.shared.transaction() as db:
+            db.execute(
+                "INSERT INTO sessions (session_id, data, version, last_seen) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET data = excluded.data, "
+                "version = sessions.version + 1, last_seen = excluded.last_seen",
+                (state.session_id, data, now)
+            )
+            version = db.execute(
+                "SELECT version FROM sessions WHERE session_id = ?", (state.session_id,)
+            ).fetchone()[0]
+            self.saves += 1
+            # Sweep expired sessions now and then rather than on every request
+            if self.saves % 100 == 0:
+                db.execute("DELETE FROM sessions WHERE last_seen < ?", (now - self.ttl,))
+        self._remember(state.session_id, state, version)
+
+    def _remember(self, session_id, state, version):
+        with self._lock:
+            self._local.pop(session_id, None)
+            self._local[session_id] = (state, version)
+            # Dicts keep insertion order, so the first key is the least recently used
+            while len(self._local) > self.max_sessions:
+                del self._local[next(iter(self._local))]
+
+    def stats(self):
+        """Return session counts across all workers"""
+        row = self.shared.connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions WHERE last_seen >= ?",
+            (time.time() - self.ttl,)
+        ).fetchone()
+        return {
+            "active_sessions": row[0],
+            "stored_bytes": row[1],
+            "sessions_created": self.created,
+            "sessions_rehydrated": self.rehydrated,
+            "decoded_in_worker": len(self._local)
+        }
+
+
+class SharedRateLimiter:
+    """RateLimiter whose token buckets are shared by every worker process"""
+
+    def __init__(self, shared, rate=0.5, burst=10):
+        self.shared = shared
+        self.rate = rate
+        self.burst = burst
+        self.limited = 0
+        self._checks = 0
+
+    def check(self, key, cost=1):
+        """Take cost tokens for key; return 0 when allowed, otherwise seconds until it would be"""
+        now = time.time()
+        with self.shared.transaction() as db:
+            row = db.execute("SELECT tokens, updated FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            db.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now)
+            )
+            self._checks += 1
+            # A bucket idle long enough to refill completely can be forgotten
+            if self._checks % 1000 == 0:
+                db.execute("DELETE FROM rate_limits WHERE updated < ?", (now - self.burst / self.rate,))
+
+        if allowed:
+            return 0.0
+        self.limited += 1
+        return (cost - tokens) / self.rate
+
+    def stats(self):
+        row = self.shared.connection().execute("SELECT COUNT(*) FROM rate_limits").fetchone()
+        return {"tracked_keys": row[0], "limited": self.limited}
+
+
+class SharedResponseBuffer:
+    """ResponseBuffer kept in the shared store, so any worker can serve /get_next_chunk"""
+
+    def __init__(self, shared, max_responses=1000, ttl=300):
+        self.shared = shared
+        self.max_responses = max_responses
+        self.ttl = ttl
+        self.expirations = 0
+        self.evictions = 0
+
+    def put(self, chunks, complete=True):
+        """Store the chunks of a response and return the id used to read them back"""
+        response_id = secrets.token_urlsafe(8)
+        chunks = list(chunks)
+        now = time.time()
+        with self.shared.transaction() as db:
+            self._expire(db, now)
+            db.execute(
+                "INSERT INTO buffered_responses (response_id, cursor, size, complete, expires_at) VALUES (?, 0, ?, ?, ?)",
+                (response_id, len(chunks), int(complete), now + self.ttl)
+            )
+            db.executemany(
+                "INSERT INTO buffered_chunks (response_id, seq, chunk) VALUES (?, ?, ?)",
+                [(response_id, seq, chunk) for seq, chunk in enumerate(chunks)]
+            )
+
+            # Drop the responses closest to expiring once the buffer is full
+            evicted = db.execute(
+                "SELECT response_id FROM buffered_responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?",
+                (self.max_responses,)
+            ).fetchall()
+            for (old_id,) in evicted:
+                self._delete(db, old_id)
+            self.evictions += len(evicted)
+        return response_id
+
+    def append(self, response_id, chunks, complete=True):
+        """Add chunks to a response that is still being produced; False if it is gone"""
+        chunks = list(chunks)
+        with self.shared.transaction() as db:
+            row = db.execute("SELECT size FROM buffered_responses WHERE response_id = ?", (response_id,)).fetchone()
+            if row is None:
+                return False
+            db.executemany(
+                "INSERT INTO buffered_chunks (response_id, seq, chunk) VALUES (?, ?, ?)",
+                [(response_id, row[0] + offset, chunk) for offset, chunk in enumerate(chunks)]
+            )
+            db.execute(
+                "UPDATE buffered_responses SET size = ?, complete = ? WHERE response_id = ?",
+                (row[0] + len(chunks), int(complete), response_id)
+            )
+        return True
+
+    def next_chunk(self, response_id):
+        """Return (chunk, has_more) for the next unread chunk, or None if the id is unknown
+
+        While a response is still being produced and has no unread chunk,
+        returns ("", True) so the client polls again.
+        """
+        now = time.time()
+        with self.shared.transaction() as db:
+            row = db.execute(
+                "SELECT cursor, size, complete, expires_at FROM buffered_responses WHERE response_id = ?",
+                (response_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            cursor, size, complete, expires_at = row
+            if expires_at < now:
+                self._delete(db, response_id)
+                self.expirations += 1
+                return None
+
+            if cursor >= size:
+                if complete:
+                    self._delete(db, response_id)
+                    return '', False
+                db.execute("UPDATE buffered_responses SET expires_at = ? WHERE response_id = ?",
+                           (now + self.ttl, response_id))
+                return '', True
+
+            chunk = db.execute(
+                "SELECT chunk FROM buffered_chunks WHERE response_id = ? AND seq = ?", (response_id, cursor)
+            ).fetchone()[0]
+            cursor += 1
+            if cursor >= size and complete:
+                self._delete(db, response_id)
+                return chunk, False
+
+            db.execute(
+                "UPDATE buffered_responses SET cursor = ?, expires_at = ? WHERE response_id = ?",
+                (cursor, now + self.ttl, response_id)
+            )
+            return chunk, True
+
+    def _delete(self, db, response_id):
+        db.execute("DELETE FROM buffered_chunks WHERE response_id = ?", (response_id,))
+        db.execute("DELETE FROM buffered_responses WHERE response_id = ?", (response_id,))
+
+    def _expire(self, db, now):
+        expired = db.execute(
+            "SELECT response_id FROM buffered_responses WHERE expires_at < ?", (now,)
+        ).fetchall()
+        for (response_id,) in expired:
+            self._delete(db, response_id)
+        self.expirations += len(expired)
+
+    def stats(self):
+        row = self.shared.connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size - cursor), 0) FROM buffered_responses"
+        ).fetchone()
+        return {
+            "buffered_responses": row[0],
+            "buffered_chunks": row[1],
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """An in-flight or recently finished call shared by every caller with the same key"""
+
+    __slots__ = ("event", "result", "error", "finished_at")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+
+class _LeaderCancelled(Exception):
+    """The coroutine running a coalesced call was cancelled before it finished"""
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into a single execution"""
+
+    def __init__(self, window=0.0):
+        self.window = window  # Seconds a finished result keeps being shared with late callers
+
+        self._in_flight = {}
+        self._async_in_flight = {}  # key -> asyncio.Future shared by coroutine callers
+        self._recent = OrderedDict()  # key -> finished _Call, oldest first
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Run fn once per key at a time; concurrent callers wait for and share its result"""
+        with self._lock:
+            self._expire(time.monotonic())
+            call = self._in_flight.get(key) or self._recent.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._in_flight[key] = call
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    call.finished_at = time.monotonic()
+                    del self._in_flight[key]
+                    # Only successful results are shared after the call finishes
+                    if self.window > 0 and call.error is None:
+                        self._recent[key] = call
+                call.event.set()
+        else:
+            logger.debug("Waiting on identical in-flight request")
+            call.event.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    async def ado(self, key, coro_fn):
+        """Await coro_fn() once per key at a time; concurrent coroutines share its result
+
+        When the leading coroutine is cancelled, say because its client went
+        away, the callers waiting on it start over and one of them leads.
+        """
+        waited = False
+        while True:
+            with self._lock:
+                self._expire(time.monotonic())
+                recent = self._recent.get(key)
+                if recent is not None:
+                    self.coalesced += 1
+                    return recent.result
+
+                future = self._async_in_flight.get(key)
+                leader = future is None
+                if leader:
+                    future = asyncio.get_running_loop().create_future()
+                    self._async_in_flight[key] = future
+                    self.executions += 1
+                elif not waited:
+                    self.coalesced += 1
+
+            if leader:
+                break
+            logger.debug("Waiting on identical in-flight request")
+            waited = True
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                logger.debug("Leading request was cancelled, retrying")
+
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            with self._lock:
+                del self._async_in_flight[key]
+            # Waiting callers were not cancelled themselves, so they retry rather than fail
+            future.set_exception(_LeaderCancelled() if isinstance(e, asyncio.CancelledError) else e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+
+        with self._lock:
+            del self._async_in_flight[key]
+            if self.window > 0:
+                call = _Call()
+                call.result = result
+                call.finished_at = time.monotonic()
+                self._recent[key] = call
+        future.set_result(result)
+        return result
+
+    def _expire(self, now):
+        """Forget finished calls older than the coalescing window"""
+        while self._recent:
+            key, call = next(iter(self._recent.items()))
+            if now - call.finished_at <= self.window:
+                break
+            del self._recent[key]
+
+    def stats(self):
+        """Return execution and coalescing counters"""
+        with self._lock:
+            return {
+                "in_flight": len(self._in_flight) + len(self._async_in_flight),
+                "executions": self.executions,
+                "coalesced": self.coalesced
+            }
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import EMERGENCY, NORMAL, AdmissionController, Overloaded, RateLimiter
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        time.sleep(0.005)
+
+
+def test_normal_requests_cannot_use_reserved_slots():
+    controller = AdmissionController(max_concurrent=2, reserved=1, queue_timeout=0.05)
+    controller.acquire(NORMAL)
+    with pytest.raises(Overloaded):
+        controller.acquire(NORMAL)
+    controller.acquire(EMERGENCY)
+    assert controller.active == 2
+    assert controller.shed == {EMERGENCY: 0, NORMAL: 1}
+
+
+def test_emergencies_are_granted_before_earlier_normal_requests():
+    controller = AdmissionController(max_concurrent=1, queue_timeout=2)
+    controller.acquire(NORMAL)
+    order = []
+
+    def wait_for_slot(priority):
+        with controller.slot(priority):
+            order.append(priority)
+
+    threads = [threading.Thread(target=wait_for_slot, args=(NORMAL,))]
+    threads[0].start()
+    wait_for(lambda: controller.queue_depth == 1)
+    threads.append(threading.Thread(target=wait_for_slot, args=(EMERGENCY,)))
+    threads[1].start()
+    wait_for(lambda: controller.queue_depth == 2)
+
+    controller.release()
+    for thread in threads:
+        thread.join(2)
+    assert order == [EMERGENCY, NORMAL]
+    assert controller.active == 0
+
+
+def test_full_normal_queue_does_not_shed_emergencies():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=2)
+    controller.acquire(NORMAL)
+    waiting = threading.Thread(target=controller.acquire, args=(NORMAL,))
+    waiting.start()
+    wait_for(lambda: controller.queue_depth == 1)
+
+    with pytest.raises(Overloaded):
+        controller.acquire(NORMAL, timeout=0.05)
+    emergency = threading.Thread(target=controller.acquire, args=(EMERGENCY,))
+    emergency.start()
+    wait_for(lambda: controller.queue_depth == 2)
+    assert controller.shed[EMERGENCY] == 0
+
+    controller.release()
+    emergency.join(2)
+    assert controller.admitted[EMERGENCY] == 1
+    controller.release()
+    waiting.join(2)
+    assert controller.admitted[NORMAL] == 2
+
+
+def test_emergency_queue_has_its_own_bound():
+    controller = AdmissionController(max_concurrent=1, max_queue=10, emergency_queue=1, queue_timeout=2)
+    controller.acquire(EMERGENCY)
+    waiting = threading.Thread(target=controller.acquire, args=(EMERGENCY,))
+    waiting.start()
+    wait_for(lambda: controller.queue_depth == 1)
+
+    with pytest.raises(Overloaded):
+        controller.acquire(EMERGENCY)
+    assert controller.shed[EMERGENCY] == 1
+
+    controller.release()
+    waiting.join(2)
+
+
+def test_slot_granted_as_the_wait_times_out_is_kept(monkeypatch):
+    controller = AdmissionController(max_concurrent=1, queue_timeout=0.01)
+    controller.acquire()
+
+    class RacingEvent(threading.Event):
+        def wait(self, timeout=None):
+            # The holder releases just as the waiter gives up
+            controller.release()
+            return False
+
+    class RacingWaiter(admission._Waiter):
+        def __init__(self, priority, loop=None):
+            super().__init__(priority, loop)
+            self.event = RacingEvent()
+
+    monkeypatch.setattr(admission, "_Waiter", RacingWaiter)
+    controller.acquire()
+    assert controller.active == 1
+    assert controller.shed[NORMAL] == 0
+
+    controller.release()
+    assert controller.active == 0
+
+
+def test_timed_out_waiter_is_not_granted_a_slot_later():
+    controller = AdmissionController(max_concurrent=1, queue_timeout=0.02)
+    controller.acquire()
+    with pytest.raises(Overloaded):
+        controller.acquire()
+    controller.release()
+    assert controller.active == 0
+    assert controller.queue_depth == 0
+
+
+def test_cancelled_async_waiter_gives_up_its_place():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, queue_timeout=2)
+        controller.acquire()
+        task = asyncio.ensure_future(controller.aacquire())
+        await asyncio.sleep(0.01)
+        assert controller.queue_depth == 1
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert controller.queue_depth == 0
+        controller.release()
+        return controller.active
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_async_waiter_cancelled_after_its_grant_releases_the_slot():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, queue_timeout=2)
+        controller.acquire()
+        task = asyncio.ensure_future(controller.aacquire())
+        await asyncio.sleep(0.01)
+
+        # The slot is handed over, then the task is cancelled before it resumes
+        controller.release()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return controller.active
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_async_waiter_times_out_with_overloaded():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, queue_timeout=0.02)
+        controller.acquire()
+        with pytest.raises(Overloaded):
+            await controller.aacquire()
+        controller.release()
+        return controller.active, controller.queue_depth
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_rate_limiter_refills_over_time():
+    limiter = RateLimiter(rate=100, burst=2)
+    assert limiter.check("session") == 0
+    assert limiter.check("session") == 0
+    assert limiter.check("session") > 0
+    assert limiter.check("other") == 0
+    time.sleep(0.03)
+    assert limiter.check("session") == 0
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from batch import BatchRunner
+
+
+class EchoRunner:
+    def answer(self, message, session_id=None):
+        return f"echo {message}"
+
+
+@pytest.fixture
+def paths(tmp_path):
+    input_path = tmp_path / "input.jsonl"
+    input_path.write_text("".join(json.dumps({"message": f"line {number}"}) + "\n" for number in range(1, 6)))
+    output_path = tmp_path / "output.jsonl"
+    return str(input_path), str(output_path), str(output_path) + ".checkpoint"
+
+
+def write_checkpoint(path, input_path, completed, output_bytes):
+    with open(path, "w") as f:
+        json.dump({"input": input_path, "completed": completed, "output_bytes": output_bytes}, f)
+
+
+def read_ids(path):
+    with open(path) as f:
+        return [json.loads(line)["id"] for line in f]
+
+
+def test_resumes_after_the_checkpoint(paths):
+    input_path, output_path, checkpoint_path = paths
+    with open(output_path, "w") as f:
+        f.write(json.dumps({"id": 1, "message": "line 1", "response": "echo line 1"}) + "\n")
+        size = f.tell()
+        f.write('{"id": 2, "message": "half writ')
+    write_checkpoint(checkpoint_path, input_path, 1, size)
+
+    assert BatchRunner(EchoRunner(), workers=2).run(input_path, output_path) == 4
+    assert read_ids(output_path) == [1, 2, 3, 4, 5]
+
+
+def test_starts_over_when_the_output_is_missing(paths):
+    input_path, output_path, checkpoint_path = paths
+    write_checkpoint(checkpoint_path, input_path, 3, 300)
+
+    assert BatchRunner(EchoRunner(), workers=2).run(input_path, output_path) == 5
+    assert read_ids(output_path) == [1, 2, 3, 4, 5]
+
+
+def test_starts_over_when_the_output_is_shorter_than_the_checkpoint(paths):
+    input_path, output_path, checkpoint_path = paths
+    with open(output_path, "w") as f:
+        f.write(json.dumps({"id": 1, "message": "line 1", "response": "echo line 1"}) + "\n")
+    write_checkpoint(checkpoint_path, input_path, 3, 10000)
+
+    assert BatchRunner(EchoRunner(), workers=2).run(input_path, output_path) == 5
+    assert read_ids(output_path) == [1, 2, 3, 4, 5]
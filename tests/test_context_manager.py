@@ -0,0 +1,35 @@
+from context_manager import ContextManager, estimate_tokens
+from session_manager import ConversationState
+
+
+def long_conversation(turns, words=30):
+    state = ConversationState("session", max_turns=turns)
+    state.restore(
+        ("user" if number % 2 == 0 else "assistant",
+         f"Turn {number} asks about evacuation routes. " + "detail " * words,
+         float(number + 1))
+        for number in range(turns)
+    )
+    return state
+
+
+def test_context_stays_within_budget_as_the_summary_grows():
+    manager = ContextManager(budget_tokens=200, max_turn_tokens=60, summary_tokens=120, summarize_every=2)
+    state = long_conversation(20)
+    for number in range(6):
+        context = manager.build(state, "next question")
+        assert estimate_tokens(context) <= manager.budget_tokens
+        state.add_turn("user", f"Question {number} about shelters. " + "word " * 40)
+        state.add_turn("assistant", f"Answer {number} about shelters. " + "word " * 40)
+    assert manager.summaries > 0
+    assert "Summary of earlier conversation" in context
+
+
+def test_short_conversations_are_kept_whole():
+    manager = ContextManager()
+    state = ConversationState("session")
+    state.add_turn("user", "Is the tap water safe?")
+    state.add_turn("assistant", "Boil it first.")
+    context = manager.build(state, "And ice?")
+    assert context == "Recent conversation:\nUser: Is the tap water safe?\nAssistant: Boil it first."
+    assert manager.summaries == 0
@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from model_client import ModelClient
+from resilience import CircuitBreaker, DeadlineExceeded
+
+
+class StallingBackend:
+    """Backend whose calls hang until released while stalled, and answer at once otherwise"""
+
+    name = "stalling"
+
+    def __init__(self):
+        self.stalled = True
+        self.release = threading.Event()
+
+    def generate(self, prompt):
+        if self.stalled:
+            self.release.wait(5)
+        return f"answer to {prompt}"
+
+
+@pytest.fixture
+def backend():
+    backend = StallingBackend()
+    yield backend
+    backend.release.set()
+
+
+def test_abandoned_calls_do_not_delay_calls_after_recovery(backend):
+    client = ModelClient(backend, max_concurrency=2)
+    for number in range(2):
+        with pytest.raises(DeadlineExceeded):
+            client.generate(f"stalled {number}", deadline=0.1)
+    assert client.admission.active == 0
+    assert client.abandoned_running == 2
+
+    backend.stalled = False
+    started = time.monotonic()
+    assert client.generate("healthy", deadline=0.5) == "answer to healthy"
+    assert time.monotonic() - started < 0.5
+
+    backend.release.set()
+    deadline = time.monotonic() + 2
+    while client.abandoned_running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.abandoned_running == 0
+
+
+def test_half_open_probe_is_not_queued_behind_abandoned_calls(backend):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    client = ModelClient(backend, max_concurrency=2, breaker=breaker)
+    for number in range(2):
+        with pytest.raises(DeadlineExceeded):
+            client.generate(f"stalled {number}", deadline=0.1)
+    assert breaker.state == "open"
+
+    backend.stalled = False
+    time.sleep(0.15)
+    assert client.generate("probe", deadline=0.5) == "answer to probe"
+    assert breaker.state == "closed"
+
+
+class StreamingBackend:
+    """Backend that streams stall_after pieces and then hangs until released"""
+
+    name = "streaming"
+
+    def __init__(self, stall_after):
+        self.stall_after = stall_after
+        self.release = threading.Event()
+
+    def stream(self, prompt):
+        for number in range(3):
+            if number == self.stall_after:
+                self.release.wait(5)
+            yield f"piece {number} "
+
+
+def test_stream_gives_up_before_the_first_piece():
+    backend = StreamingBackend(stall_after=0)
+    client = ModelClient(backend)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        list(client.stream("stalled", deadline=0.1, idle_timeout=1.0))
+    assert time.monotonic() - started < 0.5
+    assert client.admission.active == 0
+    backend.release.set()
+
+
+def test_stream_gives_up_when_idle_between_pieces():
+    backend = StreamingBackend(stall_after=1)
+    client = ModelClient(backend)
+    received = []
+    with pytest.raises(DeadlineExceeded):
+        for piece in client.stream("stalls later", deadline=1.0, idle_timeout=0.1):
+            received.append(piece)
+    assert received == ["piece 0 "]
+    backend.release.set()
+
+
+def test_stream_with_deadline_yields_every_piece():
+    backend = StreamingBackend(stall_after=None)
+    client = ModelClient(backend)
+    assert ''.join(client.stream("healthy", deadline=1.0, idle_timeout=1.0)) == "piece 0 piece 1 piece 2 "
+
+
+class FailingBackend:
+    """Backend whose every call raises the given error"""
+
+    name = "failing"
+
+    def __init__(self, error):
+        self.error = error
+
+    def generate(self, prompt):
+        raise self.error
+
+
+def test_blocked_responses_do_not_open_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    client = ModelClient(FailingBackend(ValueError("Response was blocked for safety")), breaker=breaker)
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            client.generate("blocked")
+    assert breaker.state == "closed"
+
+
+def test_transient_failures_open_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    client = ModelClient(FailingBackend(ConnectionError("reset by peer")), breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            client.generate("unreachable")
+    assert breaker.state == "open"
+
+
+class ProbeBackend:
+    """Backend that streams two pieces, and whose async calls hang until released"""
+
+    name = "probe"
+
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    def generate(self, prompt):
+        return f"answer to {prompt}"
+
+    def stream(self, prompt):
+        yield "piece 0 "
+        yield "piece 1 "
+
+    async def agenerate(self, prompt):
+        await self.release.wait()
+        return f"answer to {prompt}"
+
+
+def half_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == "half_open"
+    return breaker
+
+
+def test_stream_closed_mid_probe_lets_the_next_call_probe():
+    breaker = half_open_breaker()
+    client = ModelClient(ProbeBackend(), breaker=breaker)
+    stream = client.stream("probe")
+    assert next(stream) == "piece 0 "
+    # The client disconnects before the probe stream finishes
+    stream.close()
+
+    assert client.generate("next") == "answer to next"
+    assert breaker.state == "closed"
+
+
+def test_async_probe_cancelled_lets_the_next_call_probe():
+    breaker = half_open_breaker()
+    client = ModelClient(ProbeBackend(), breaker=breaker)
+
+    async def scenario():
+        task = asyncio.ensure_future(client.agenerate("probe"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return client.generate("next")
+
+    assert asyncio.run(scenario()) == "answer to next"
+    assert breaker.state == "closed"
+    assert client.admission.active == 0
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_followers_take_over_when_the_leader_is_cancelled():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def answer():
+            calls.append(len(calls))
+            await asyncio.sleep(0.05)
+            return f"answer {len(calls)}"
+
+        leader = asyncio.ensure_future(flight.ado("key", answer))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.ensure_future(flight.ado("key", answer)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+
+        # The leader's client disconnects; the followers' requests carry on
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        results = await asyncio.gather(*followers)
+        return calls, results, flight.stats()
+
+    calls, results, stats = asyncio.run(scenario())
+    assert len(calls) == 2
+    assert results == ["answer 2", "answer 2"]
+    assert stats == {"in_flight": 0, "executions": 2, "coalesced": 2}
+
+
+def test_leader_errors_are_shared_with_followers():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.02)
+            raise ValueError("blocked")
+
+        tasks = [asyncio.ensure_future(flight.ado("key", fail)) for _ in range(3)]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from tips_retriever import TipsRetriever
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'safety_tips.json')
+
+
+@pytest.fixture(scope="module")
+def retriever():
+    return TipsRetriever.from_file(CORPUS_PATH)
+
+
+def topic(answer):
+    return answer.split("\n")[0] if answer else None
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("heart attack", "🔒 CPR basics (First Aid):"),
+    ("How do I perform CPR?", "🔒 CPR basics (First Aid):"),
+    ("how to treat a burn", "🔒 Burns (First Aid):"),
+    ("snake bite first aid", "🔒 Animal and snake bites (Environmental Safety):"),
+    ("my wallet was stolen", "🔒 Theft and pickpocketing (Personal Security):"),
+])
+def test_common_questions_are_answered_locally(retriever, query, expected):
+    assert topic(retriever.answer(query)) == expected
+
+
+@pytest.mark.parametrize("query", [
+    # Each scores over the threshold against a document that does not answer it
+    "heart attack symptoms",
+    "symptoms of food poisoning",
+    "phishing email",
+    "travel insurance advice",
+])
+def test_near_misses_are_left_to_the_model(retriever, query):
+    assert retriever.search(query, limit=1)[0][0] >= retriever.threshold
+    assert retriever.answer(query) is None
+
+
+def test_offline_answers_do_not_need_coverage(retriever):
+    answer = retriever.answer("heart attack symptoms", threshold=0.0, require_coverage=False)
+    assert topic(answer) == "🔒 CPR basics (First Aid):"
+
+
+def test_hits_and_misses_are_counted():
+    retriever = TipsRetriever.from_file(CORPUS_PATH)
+    retriever.answer("snake bite")
+    retriever.answer("heart attack symptoms")
+    stats = retriever.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
@@ -0,0 +1,62 @@
+import pytest
+
+from trip_extractor import TripExtractor
+
+
+@pytest.fixture
+def extractor():
+    return TripExtractor({"Paris": "Paris", "Rome": "Rome", "Roma": "Rome"})
+
+
+def empty_info():
+    return {
+        "total_budget": None,
+        "trip_details": {"destination": None, "duration": None, "travel_dates": None, "travelers": None},
+        "currency": "USD"
+    }
+
+
+def test_update_fills_trip_details(extractor):
+    info = empty_info()
+    extractor.update(info, "Budget of 3,000 euros for 5 days in Roma, 2 of us")
+    assert info["total_budget"] == 3000
+    assert info["currency"] == "EUR"
+    assert info["trip_details"]["destination"] == "Rome"
+    assert info["trip_details"]["duration"] == 5
+    assert info["trip_details"]["travelers"] == 2
+
+
+def test_update_keeps_slots_the_message_does_not_mention(extractor):
+    info = empty_info()
+    extractor.update(info, "Paris for 10 days, budget 2000")
+    changed = extractor.update(info, "we are 3 people")
+    assert changed == {"travelers": 3}
+    assert info["trip_details"]["duration"] == 10
+    assert info["total_budget"] == 2000
+
+
+def test_daily_rate_does_not_overwrite_duration(extractor):
+    info = empty_info()
+    extractor.update(info, "5 days in Paris")
+    extractor.update(info, "I want to spend 200 a day")
+    assert info["trip_details"]["duration"] == 5
+
+    extractor.update(info, "no more than 80 euros a night on hotels")
+    assert info["trip_details"]["duration"] == 5
+
+
+def test_article_before_a_unit_counts_as_one(extractor):
+    assert extractor.extract("Rome for a week")["duration"] == 7
+    assert extractor.extract("an overnight stay? no, a night in Paris")["duration"] == 1
+    assert extractor.extract("a couple of weeks")["duration"] == 14
+
+
+def test_grouped_digits_are_read_as_the_budget(extractor):
+    info = empty_info()
+    extractor.update(info, "plan a 1,00,000 budget")
+    assert info["total_budget"] == 100000
+    assert extractor.extract("budget of 50,000 rupees") == {"total_budget": 50000, "currency": "INR"}
+
+
+def test_bare_numbers_are_not_money(extractor):
+    assert extractor.extract("I have 3 questions about Paris") == {"destination": "Paris"}
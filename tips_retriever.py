@@ -0,0 +1,166 @@
+import json
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+import logging
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset([
+    "a", "an", "and", "are", "as", "at", "be", "can", "do", "does", "for", "from", "how",
+    "i", "if", "in", "is", "it", "me", "my", "of", "on", "or", "should", "so", "some",
+    "the", "to", "what", "when", "where", "which", "who", "why", "with", "you", "your",
+    "about", "tell", "please", "give", "need", "want", "know", "get", "any",
+    "was", "were", "am", "been", "has", "have", "had"
+])
+
+
+def stem(word):
+    """Strip common English suffixes so "traveling" and "travel" share a term"""
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+# Words that ask for advice without naming what it is about
+GENERIC_WORDS = frozenset(stem(word) for word in [
+    "tips", "advice", "help", "safe", "safety", "safely", "avoid", "prevent", "protect", "stay", "staying",
+    "keep", "treat", "treatment", "handle", "deal", "perform", "first", "aid", "guide", "during"
+])
+
+
+def content_words(text):
+    """Stemmed words of a question that name what it is about"""
+    words = [stem(word) for word in TOKEN_PATTERN.findall(text.lower()) if word not in STOP_WORDS]
+    return [word for word in words if word not in GENERIC_WORDS]
+
+
+def tokenize(text):
+    """Stemmed word tokens plus adjacent-word bigrams, without stop words"""
+    words = [stem(word) for word in TOKEN_PATTERN.findall(text.lower()) if word not in STOP_WORDS]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+class TipsRetriever:
+    """Answer common safety questions from a local tips corpus using TF-IDF scoring
+
+    A short question can clear the threshold on one or two matching words,
+    so the document answering it must also mention every content word:
+    "heart attack symptoms" scores well against the CPR tips, but nothing
+    there covers symptoms, so the model answers it. Longer questions rely
+    on the score alone.
+    """
+
+    short_query_words = 3  # Questions with at most this many content words need full coverage
+
+    def __init__(self, documents, threshold=0.2):
+        self.documents = documents
+        self.threshold = threshold  # Minimum cosine similarity for a local answer
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        # Topic and keywords describe what a document answers, so they count double
+        term_counts = []
+        self._doc_words = []  # Unigrams of each document, for checking a question is covered
+        for doc in documents:
+            text = ' '.join([doc["topic"], doc["category"]] + doc.get("keywords", []))
+            counts = Counter(tokenize(text))
+            for term in counts:
+                counts[term] *= 2
+            counts.update(tokenize(' '.join(doc["tips"])))
+            term_counts.append(counts)
+            self._doc_words.append({term for term in counts if ' ' not in term})
+
+        document_frequency = Counter(term for counts in term_counts for term in counts)
+        total = len(documents)
+        self._idf = {
+            term: math.log((1 + total) / (1 + frequency)) + 1
+            for term, frequency in document_frequency.items()
+        }
+
+        # Inverted index of term -> [(doc_id, normalized tf-idf weight)]
+        self._index = defaultdict(list)
+        for doc_id, counts in enumerate(term_counts):
+            weights = {term: (1 + math.log(count)) * self._idf[term] for term, count in counts.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            for term, weight in weights.items():
+                self._index[term].append((doc_id, weight / norm))
+
+        logger.info(f"Indexed {total} safety tip documents with {len(self._index)} terms")
+
+    @classmethod
+    def from_file(cls, path, threshold=0.2):
+        """Load a JSON list of {category, topic, keywords, tips} documents"""
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), threshold=threshold)
+
+    def search(self, query, limit=3):
+        """Return up to limit (score, document) pairs, best first"""
+        return [(score, self.documents[doc_id]) for score, doc_id in self._search(query, limit)]
+
+    def _search(self, query, limit):
+        counts = Counter(term for term in tokenize(query) if term in self._index)
+        if not counts:
+            return []
+
+        weights = {term: (1 + math.log(count)) * self._idf[term] for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+
+        scores = defaultdict(float)
+        for term, weight in weights.items():
+            for doc_id, doc_weight in self._index[term]:
+                scores[doc_id] += weight / norm * doc_weight
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(score, doc_id) for doc_id, score in best]
+
+    def covers(self, query, doc_id):
+        """Whether a document answers a short query's every content word; longer queries always pass"""
+        words = content_words(query)
+        return len(words) > self.short_query_words or all(word in self._doc_words[doc_id] for word in words)
+
+    def answer(self, query, threshold=None, require_coverage=True):
+        """Return a formatted local answer, or None when no document is a confident match
+
+        Without require_coverage the best match above the threshold is used
+        even if it leaves part of the question unanswered.
+        """
+        if threshold is None:
+            threshold = self.threshold
+        results = self._search(query, limit=1)
+        confident = bool(results) and results[0][0] >= threshold and (
+            not require_coverage or self.covers(query, results[0][1])
+        )
+
+        with self._lock:
+            if confident:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not confident:
+            return None
+
+        score, doc_id = results[0]
+        doc = self.documents[doc_id]
+        logger.debug(f"Answering locally from '{doc['topic']}' (score {score:.2f})")
+        response = f"🔒 {doc['topic']} ({doc['category']}):\n\n"
+        for tip in doc["tips"]:
+            response += f"• {tip}\n"
+        return response
+
+    def stats(self):
+        """Return local answer hit and miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "documents": len(self.documents),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
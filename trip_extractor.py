@@ -0,0 +1,185 @@
+import re
+import logging
+from intent_router import build_trie_pattern
+
+logger = logging.getLogger(__name__)
+
+WORD_NUMBERS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15, "twenty": 20,
+    "a couple of": 2, "couple of": 2, "a few": 3
+}
+
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "₹": "INR", "¥": "JPY"}
+CURRENCY_WORDS = {
+    "usd": "USD", "dollar": "USD", "dollars": "USD", "bucks": "USD",
+    "eur": "EUR", "euro": "EUR", "euros": "EUR",
+    "gbp": "GBP", "pound": "GBP", "pounds": "GBP",
+    "inr": "INR", "rs": "INR", "rs.": "INR", "rupee": "INR", "rupees": "INR",
+    "jpy": "JPY", "yen": "JPY",
+    "aud": "AUD", "cad": "CAD", "sgd": "SGD", "aed": "AED", "dirhams": "AED", "thb": "THB", "baht": "THB"
+}
+MULTIPLIERS = {
+    "k": 1000, "thousand": 1000, "grand": 1000, "lakh": 100000, "lakhs": 100000, "lac": 100000,
+    "lacs": 100000, "mn": 1000000, "million": 1000000
+}
+DURATION_UNITS = {"day": 1, "days": 1, "night": 1, "nights": 1, "week": 7, "weeks": 7, "wk": 7, "wks": 7,
+                  "month": 30, "months": 30}
+
+
+def _alternation(words):
+    # Longest first so "a couple of" wins over "couple of"
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+# Digits with thousands separators (50,000 or 1,00,000) or a plain decimal
+NUMBER = r'\d{1,3}(?:,\d{2,3})+(?:\.\d+)?|\d+(?:\.\d+)?'
+COUNT = r'\d+|' + _alternation(WORD_NUMBERS)
+CURRENCY_WORD = _alternation(CURRENCY_WORDS)
+
+# One alternative per slot; a message is scanned once and each match is
+# dispatched on the name of the alternative that matched
+SLOT_PATTERNS = [
+    # "a"/"an" only count as one right before the unit, as in "for a week"
+    ("duration", rf'(?:(?P<duration_count>{COUNT})[\s-]*|(?P<duration_article>an?)\s+)'
+                 rf'(?P<duration_unit>{_alternation(DURATION_UNITS)})(?!\w)'),
+    ("fortnight", r'fortnight(?!\w)'),
+    ("long_weekend", r'long weekend(?!\w)'),
+    ("weekend", r'weekend(?!\w)'),
+    ("companions", rf'with\s+(?P<companion_count>{COUNT})\s+(?:friends|others|colleagues|kids|children)(?!\w)'),
+    ("travelers", rf'(?P<traveler_count>{COUNT})\s+(?:of\s+us|people|persons|pax|travell?ers|adults|guests|friends)(?!\w)'),
+    ("family", rf'family\s+of\s+(?P<family_count>{COUNT})(?!\w)'),
+    ("solo", r'(?:solo|alone|by\s+myself|on\s+my\s+own)(?!\w)'),
+    ("couple", r'(?:honeymoon|as\s+a\s+couple|with\s+my\s+(?:wife|husband|partner|girlfriend|boyfriend))(?!\w)'),
+    ("money", rf'(?P<budget_cue>budget\s+(?:of\s+|is\s+|:\s*)?(?:around\s+|about\s+|roughly\s+)?)?'
+              rf'(?P<symbol>[{re.escape("".join(CURRENCY_SYMBOLS))}]|(?:{CURRENCY_WORD})\s?)?'
+              rf'(?P<amount>{NUMBER})\s?'
+              rf'(?P<multiplier>{_alternation(MULTIPLIERS)})?(?!\w)\s?'
+              rf'(?P<currency>{CURRENCY_WORD})?(?!\w)'),
+    ("budget_word", r'(?:budget|spend|afford|have)(?!\w)'),
+]
+
+
+def parse_count(text):
+    return int(text) if text.isdigit() else WORD_NUMBERS[text]
+
+
+class TripExtractor:
+    """Pull budget, currency, duration, traveller count and destination out of a message
+
+    Every slot pattern and the destination gazetteer, compiled as a prefix
+    trie, form one precompiled regex, so a message is read in a single pass
+    however many destinations are known.
+    """
+
+    def __init__(self, destinations):
+        # destinations maps lowercase names and aliases to the name stored in the trip details
+        self.destinations = {name.lower(): canonical for name, canonical in destinations.items()}
+        slots = SLOT_PATTERNS + [
+            ("destination", r'(?P<origin>from\s+)?(?P<place>' + build_trie_pattern(self.destinations) + r')(?!\w)')
+        ]
+        # Messages are lowercased once up front, which is faster than IGNORECASE
+        self._pattern = re.compile(
+            r'(?<!\w)(?:' + '|'.join(f'(?P<{name}>{pattern})' for name, pattern in slots) + ')'
+        )
+        logger.debug(f"Compiled trip extractor with {len(self.destinations)} destination names")
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a gazetteer with one destination per line and aliases after "|" """
+        destinations = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                names = [name.strip() for name in line.split('|')]
+                for name in names:
+                    destinations[name] = names[0]
+        return cls(destinations)
+
+    def extract(self, message):
+        """Return a dict of the trip details found in a message; slots not mentioned are left out"""
+        details = {}
+        amounts = []  # (has_budget_cue, amount, currency) for each sum of money
+        budget_mentioned = False
+        text = message.lower()
+        amount_end = None  # Where the last number read as money ended
+
+        for match in self._pattern.finditer(text):
+            slot = match.lastgroup
+            if slot == "duration":
+                if match.group("duration_article"):
+                    # "200 a day" is a rate, not a one-day trip
+                    if amount_end is not None and not text[amount_end:match.start()].strip():
+                        continue
+                    count = 1
+                else:
+                    count = parse_count(match.group("duration_count"))
+                details["duration"] = count * DURATION_UNITS[match.group("duration_unit")]
+            elif slot == "fortnight":
+                details["duration"] = 14
+            elif slot == "long_weekend":
+                details["duration"] = 3
+            elif slot == "weekend":
+                details.setdefault("duration", 2)
+            elif slot == "companions":
+                details["travelers"] = parse_count(match.group("companion_count")) + 1
+            elif slot == "travelers":
+                details["travelers"] = parse_count(match.group("traveler_count"))
+            elif slot == "family":
+                details["travelers"] = parse_count(match.group("family_count"))
+            elif slot == "solo":
+                details["travelers"] = 1
+            elif slot == "couple":
+                details["travelers"] = 2
+            elif slot == "money":
+                amount_end = match.end()
+                amount = self._money(match)
+                if amount is not None:
+                    amounts.append(amount)
+                budget_mentioned = budget_mentioned or match.group("budget_cue") is not None
+            elif slot == "budget_word":
+                budget_mentioned = True
+            elif slot == "destination" and not match.group("origin"):
+                details.setdefault("destination", self.destinations[match.group("place")])
+
+        # A sum introduced as the budget wins; otherwise the largest sum counts
+        # when the message talks about the budget at all
+        if amounts and budget_mentioned:
+            cue, amount, currency = max(amounts, key=lambda entry: (entry[0], entry[1]))
+            details["total_budget"] = amount
+            if currency:
+                details["currency"] = currency
+        elif amounts:
+            currencies = [currency for _, _, currency in amounts if currency]
+            if currencies:
+                details["currency"] = currencies[0]
+        return details
+
+    def _money(self, match):
+        """Return (has_budget_cue, amount, currency) for a money match, or None for a bare number"""
+        symbol = (match.group("symbol") or '').strip()
+        multiplier = match.group("multiplier") or ''
+        currency_word = match.group("currency") or ''
+        cue = match.group("budget_cue") is not None
+        amount = match.group("amount")
+        # A bare number is only money when it is introduced as the budget or
+        # written with thousands separators, as in "a 1,00,000 budget"
+        if not (symbol or multiplier or currency_word or cue or ',' in amount):
+            return None
+
+        amount = float(amount.replace(',', '')) * MULTIPLIERS.get(multiplier, 1)
+        currency = CURRENCY_SYMBOLS.get(symbol) or CURRENCY_WORDS.get(symbol) or CURRENCY_WORDS.get(currency_word)
+        return cue, int(amount) if amount.is_integer() else round(amount, 2), currency
+
+    def update(self, travel_budget_info, message):
+        """Fill the bot's travel_budget_info from a message and return what changed"""
+        details = self.extract(message)
+        for slot in ("total_budget", "currency"):
+            if slot in details:
+                travel_budget_info[slot] = details[slot]
+        for slot in ("destination", "duration", "travelers"):
+            if slot in details:
+                travel_budget_info["trip_details"][slot] = details[slot]
+        return details